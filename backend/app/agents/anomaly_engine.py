@@ -0,0 +1,223 @@
+import math
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime
+from typing import AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple
+from app.core.config import settings
+
+# 🟢 STREAMING ANOMALY ENGINE
+# Scores transactions one at a time against a small, fixed-size state per vendor
+# (plus one per tenant), so scoring a new statement costs the same whether the
+# tenant has a month or ten years of history. Signals:
+# - amount: EWMA mean/variance z-score and a robust median/MAD z-score
+# - timing: a regular vendor charging much earlier than its usual interval
+# - bursts: many never-seen vendors showing up in a short time
+
+SEED_SIZE = 5           # Exact median/MAD over the first few amounts, streaming estimates after
+MAD_SCALE = 1.4826      # MAD -> std for normally distributed data
+BURST_HALF_LIFE_DAYS = 1.0
+
+
+def _squash(z: float, start: float = 2.0) -> float:
+    """Maps a z-score to a 0..1 risk: 0 up to `start`, ~0.63 two units above it, -> 1."""
+    if z is None or z <= start:
+        return 0.0
+    return 1.0 - math.exp(-(z - start) / 2.0)
+
+
+def _day_number(value) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.toordinal() + (value.hour * 3600 + value.minute * 60 + value.second) / 86400
+    if isinstance(value, date):
+        return float(value.toordinal())
+    return float(datetime.fromisoformat(str(value)).toordinal())
+
+
+def _median(values: List[float]) -> float:
+    ordered = sorted(values)
+    mid = len(ordered) // 2
+    return ordered[mid] if len(ordered) % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+
+
+@dataclass
+class VendorState:
+    count: int = 0
+    mean: float = 0.0           # EWMA of the amount
+    var: float = 0.0            # EWMA variance of the amount
+    median: float = 0.0         # Streaming median estimate
+    mad: float = 0.0            # Streaming median absolute deviation estimate
+    seed: List[float] = field(default_factory=list)
+    last_day: Optional[float] = None
+    gap_mean: float = 0.0       # EWMA of days between charges
+    gap_var: float = 0.0
+    gaps: int = 0
+
+
+@dataclass
+class TenantState:
+    burst: float = 0.0          # Decayed count of first-seen vendors
+    last_day: Optional[float] = None
+    seen: int = 0               # Transactions scored so far
+
+
+class StreamingAnomalyScorer:
+    """
+    Stateful scorer for one tenant. Feed transactions in date order with
+    score(); read back the (small) states with export() to persist them.
+    """
+
+    def __init__(self, vendors: Dict[str, VendorState] = None, tenant: TenantState = None):
+        self.vendors: Dict[str, VendorState] = vendors or {}
+        self.tenant = tenant or TenantState()
+        self.alpha = settings.ANOMALY_EWMA_ALPHA
+        self.warmup = settings.ANOMALY_WARMUP
+        self.alert_score = settings.ANOMALY_ALERT_SCORE
+        self.burst_limit = settings.ANOMALY_NEW_VENDOR_BURST
+        self.touched = set()
+        self.observed: List[Tuple[str, float, float]] = []  # (vendor, amount, day) scored since load
+
+    # --- scoring ---
+
+    def _amount_score(self, state: VendorState, amount: float) -> Tuple[float, float]:
+        if state.count < self.warmup:
+            return 0.0, 0.0
+        std = math.sqrt(max(state.var, 0.0)) or abs(state.mean) * 0.2 or 1.0
+        z_ewma = (amount - state.mean) / std
+        robust_std = MAD_SCALE * state.mad or abs(state.median) * 0.2 or 1.0
+        z_robust = (amount - state.median) / robust_std
+        # EWMA follows recent drift; median/MAD isn't inflated by earlier spikes
+        z = max(z_ewma, z_robust)
+        return _squash(z), z
+
+    def _timing_score(self, state: VendorState, day: float) -> Tuple[float, float]:
+        if state.gaps < self.warmup or state.last_day is None:
+            return 0.0, 0.0
+        gap = day - state.last_day
+        spread = math.sqrt(max(state.gap_var, 0.0))
+        # Only regular vendors (subscriptions, rent, payroll) have a meaningful interval
+        if state.gap_mean < 1.0 or spread > 0.5 * state.gap_mean:
+            return 0.0, 0.0
+        z_early = (state.gap_mean - gap) / max(spread, 1.0)
+        return _squash(z_early, start=3.0), gap
+
+    def _burst_score(self, day: float, is_new: bool) -> float:
+        tenant = self.tenant
+        if tenant.last_day is not None and day > tenant.last_day:
+            tenant.burst *= 0.5 ** ((day - tenant.last_day) / BURST_HALF_LIFE_DAYS)
+        tenant.last_day = day if tenant.last_day is None else max(tenant.last_day, day)
+        tenant.seen += 1
+        if not is_new:
+            return 0.0
+        tenant.burst += 1.0
+        # A new tenant's first statements are all first-seen vendors
+        if tenant.seen <= settings.ANOMALY_TENANT_WARMUP:
+            return 0.0
+        return _squash(tenant.burst / max(self.burst_limit, 1) * 2.0)
+
+    def score(self, vendor: str, amount: float, when) -> dict:
+        """Scores one transaction, then folds it into the state. O(1)."""
+        day = _day_number(when)
+        state = self.vendors.get(vendor)
+        is_new = state is None
+        if is_new:
+            state = self.vendors[vendor] = VendorState()
+
+        amount_risk, amount_z = self._amount_score(state, amount)
+        timing_risk, gap = self._timing_score(state, day)
+        burst_risk = self._burst_score(day, is_new)
+        risk = max(amount_risk, timing_risk, burst_risk)
+
+        if amount_risk == risk and amount_risk > 0:
+            note = f"Amount {amount_z:.1f}σ above usual (~${state.median:.2f})"
+        elif timing_risk == risk and timing_risk > 0:
+            note = f"Charged after {gap:.0f} days, usually every {state.gap_mean:.0f}"
+        elif burst_risk == risk and burst_risk > 0:
+            note = f"New vendor during a burst of {self.tenant.burst:.0f} first-seen vendors"
+        else:
+            note = "Normal behavior"
+
+        self._update(state, amount, day)
+        self.touched.add(vendor)
+        self.observed.append((vendor, amount, day))
+        return {
+            "status": "ALERT" if risk >= self.alert_score else "OK",
+            "risk_score": round(risk, 3),
+            "note": note,
+            "signals": {"amount": round(amount_risk, 3), "timing": round(timing_risk, 3), "burst": round(burst_risk, 3)},
+        }
+
+    async def score_stream(self, transactions: AsyncIterable) -> AsyncIterator[Tuple[object, dict]]:
+        """Scores an async stream of transactions (anything with vendor/amount/date), in order."""
+        async for txn in transactions:
+            yield txn, self.score(txn.vendor or "Unknown", float(txn.amount), txn.date)
+
+    # --- state updates ---
+
+    def _update(self, state: VendorState, amount: float, day: float):
+        alpha = self.alpha
+        state.count += 1
+        if state.count == 1:
+            state.mean, state.var = amount, 0.0
+        else:
+            delta = amount - state.mean
+            state.mean += alpha * delta
+            state.var = (1 - alpha) * (state.var + alpha * delta * delta)
+
+        if len(state.seed) < SEED_SIZE:
+            state.seed.append(amount)
+            state.median = _median(state.seed)
+            state.mad = _median([abs(value - state.median) for value in state.seed])
+        else:
+            # Frugal streaming quantiles: step towards the sample, scaled by the spread
+            step = max(state.mad, abs(state.median) * 0.01, 0.01) * alpha
+            state.median += step if amount > state.median else -step if amount < state.median else 0.0
+            deviation = abs(amount - state.median)
+            state.mad += step if deviation > state.mad else -step if deviation < state.mad else 0.0
+            state.mad = max(state.mad, 0.0)
+
+        if state.last_day is not None and day >= state.last_day:
+            gap = day - state.last_day
+            if state.gaps == 0:
+                state.gap_mean, state.gap_var = gap, 0.0
+            else:
+                delta = gap - state.gap_mean
+                state.gap_mean += alpha * delta
+                state.gap_var = (1 - alpha) * (state.gap_var + alpha * delta * delta)
+            state.gaps += 1
+        if state.last_day is None or day > state.last_day:
+            state.last_day = day
+
+    # --- persistence helpers ---
+
+    def export(self) -> Tuple[Dict[str, dict], dict]:
+        """States changed since load: ({vendor: state}, tenant_state), as plain dicts."""
+        return {vendor: asdict(self.vendors[vendor]) for vendor in self.touched}, asdict(self.tenant)
+
+    @classmethod
+    def from_states(cls, vendor_states: Dict[str, dict], tenant_state: Optional[dict]) -> "StreamingAnomalyScorer":
+        vendors = {vendor: VendorState(**state) for vendor, state in vendor_states.items()}
+        tenant = TenantState(**tenant_state) if tenant_state else None
+        return cls(vendors, tenant)
+
+    def replay_onto(self, vendor_states: Dict[str, dict], tenant_state: Optional[dict]) -> "StreamingAnomalyScorer":
+        """
+        The states this scorer would have reached had it started from the given
+        (newer) ones: its observations are folded in again, in the same order.
+        Used when another upload saved the same vendors after we loaded them.
+        """
+        merged = StreamingAnomalyScorer.from_states(vendor_states, tenant_state)
+        for vendor, amount, day in self.observed:
+            merged.score(vendor, amount, day)
+        return merged
+
+
+def combine_audits(batch_result: dict, stream_result: dict) -> dict:
+    """Merges the baseline auditor's verdict with the streaming engine's."""
+    alert = batch_result.get("status") == "ALERT" or stream_result["status"] == "ALERT"
+    notes = [r["note"] for r in (batch_result, stream_result) if r.get("status") == "ALERT"]
+    return {
+        "status": "ALERT" if alert else "OK",
+        "risk_score": max(batch_result.get("risk_score", 0.0), stream_result["risk_score"]),
+        "note": " | ".join(notes) if notes else batch_result.get("note", "Normal behavior"),
+    }
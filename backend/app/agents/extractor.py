@@ -1,125 +1,313 @@
+import asyncio
 import json
-import re
-from datetime import datetime
+from collections import Counter
+from typing import AsyncIterable, List, NamedTuple
 from fastapi import HTTPException
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_groq import ChatGroq
 from app.core.config import settings
+from app.services.ingestion import PAGE_BREAK
+from app.agents.statement_parser import GENERIC_TEMPLATE, MONEY_TOKEN, PUNCTUATION, detect_template, parse_with_template
+from app.services.llm_scheduler import llm_scheduler, LLMRateLimitError, estimate_tokens, format_wait
+from app.services.extraction_cache import ExtractionCache, chunk_key
+from fastapi.concurrency import run_in_threadpool
 
 # Initialize Fast LLM
 llm = ChatGroq(
-    temperature=0, 
-    model_name="llama-3.3-70b-versatile", 
+    temperature=0,
+    model_name="llama-3.3-70b-versatile",
     api_key=settings.GROQ_API_KEY
 )
 
-async def text_to_transactions(raw_text: str):
+# 🟢 Bump whenever EXTRACTION_PROMPT changes: cached answers of older versions are dropped
+EXTRACTION_PROMPT_VERSION = "1"
+
+# --- FIX 1: Double Curly Braces {{ }} for JSON examples ---
+EXTRACTION_PROMPT = ChatPromptTemplate.from_template(
     """
-    Uses AI to parse messy PDF text into structured JSON.
-    Includes Rate Limit detection and Regex Fallback.
+    You are a Financial Data Extraction Engine.
+    Your task is to extract transactions from the raw bank statement text below.
+
+    CRITICAL ANALYSIS RULES:
+    1. The text is messy. A single transaction often spans 2-4 lines.
+    2. You must MERGE related lines to find the full context.
+    3. DATE FORMAT: Look for dates like DD/MM/YYYY (e.g., 02/04/2026).
+    4. AMOUNT FORMAT: Look for numbers with '-' (debit) or '+' (credit).
+       - Example: "-400.00" -> Amount: 400.00 (Debit)
+       - Example: "+52000.00" -> Amount: 52000.00 (Credit/Income)
+    5. VENDOR/DESC: The name is often on the line ABOVE or BELOW the date.
+
+    OUTPUT FORMAT:
+    Return ONLY a JSON Array of objects. No Markdown.
+    [{{ "date": "YYYY-MM-DD", "description": "Full Description", "amount": 0.00, "vendor": "Name" }}]
+
+    RAW TEXT TO PROCESS:
+    {text}
+    """
+)
+
+extraction_cache = ExtractionCache(
+    settings.EXTRACTION_CACHE_PATH,
+    settings.EXTRACTION_CACHE_MAX_ENTRIES,
+    EXTRACTION_PROMPT_VERSION,
+    settings.EXTRACTION_CACHE_VERSION_GRACE_SECONDS
+)
+
+
+class StatementChunk(NamedTuple):
+    text: str
+    overlap: str  # Leading lines repeated from the previous chunk ("" for the first)
+
+
+class StatementChunker:
+    """
+    Groups statement lines into LLM-sized chunks.
+    Chunks close on a page boundary when the next page won't fit, otherwise on a
+    line boundary. The last few lines of each chunk are repeated at the start of
+    the next one so a transaction split across the seam is still seen whole;
+    each chunk records those lines so the merge can tell overlap rows apart.
     """
-    # Truncate to safe limit
-    safe_text = raw_text[:20000] 
 
-    print(f" Extractor: Analyzing {len(safe_text)} chars...")
+    def __init__(self, max_chars: int = None, overlap_lines: int = None):
+        self.max_chars = max_chars or settings.EXTRACT_CHUNK_CHARS
+        self.overlap_lines = settings.EXTRACT_CHUNK_OVERLAP_LINES if overlap_lines is None else overlap_lines
+        self.lines: List[str] = []
+        self.size = 0
+        self.new_lines = 0  # Lines not already sent as part of the previous chunk
+
+    def feed_page(self, page_text: str) -> List[StatementChunk]:
+        """Adds one page and returns any chunks that are now complete."""
+        ready = []
+        page_lines = [line for line in page_text.splitlines() if line.strip()]
+        page_size = sum(len(line) + 1 for line in page_lines)
+
+        if self.new_lines and self.size + page_size > self.max_chars:
+            ready.append(self._emit())
 
+        for line in page_lines:
+            if self.new_lines and self.size + len(line) + 1 > self.max_chars:
+                ready.append(self._emit())
+            self.lines.append(line)
+            self.size += len(line) + 1
+            self.new_lines += 1
+
+        return ready
+
+    def finish(self) -> List[StatementChunk]:
+        return [self._emit()] if self.new_lines else []
+
+    def _emit(self) -> StatementChunk:
+        carried = len(self.lines) - self.new_lines
+        chunk = StatementChunk("\n".join(self.lines), "\n".join(self.lines[:carried]))
+        self.lines = self.lines[-self.overlap_lines:] if self.overlap_lines else []
+        self.size = sum(len(line) + 1 for line in self.lines)
+        self.new_lines = 0
+        return chunk
+
+
+def merge_chunk_results(chunk_results: List[list], overlaps: List[str] = None) -> list:
+    """
+    Concatenates per-chunk results in document order.
+    A row is dropped only when it can have come from the overlap lines at the
+    head of its chunk: the previous chunk returned the same row, and its amount
+    is printed in those overlap lines (at most as many times as it's printed).
+    Genuine repeats elsewhere in adjacent chunks are kept.
+    """
+    overlaps = overlaps or [""] * len(chunk_results)
+    merged = []
+    previous = Counter()
+    for items, overlap in zip(chunk_results, overlaps):
+        seen_in_previous = previous.copy()
+        in_overlap = _amounts_in(overlap)
+        current = Counter()
+        for item in items:
+            key = _dedupe_key(item)
+            current[key] += 1
+            amount = _cents(item.get("amount"))
+            if seen_in_previous[key] > 0 and in_overlap[amount] > 0:
+                seen_in_previous[key] -= 1
+                in_overlap[amount] -= 1
+                continue
+            merged.append(item)
+        previous = current
+    return merged
+
+
+def _cents(value):
     try:
-        # --- FIX 1: Double Curly Braces {{ }} for JSON examples ---
-        prompt = ChatPromptTemplate.from_template(
-            """
-            You are a Financial Data Extraction Engine.
-            Your task is to extract transactions from the raw bank statement text below.
-
-            CRITICAL ANALYSIS RULES:
-            1. The text is messy. A single transaction often spans 2-4 lines.
-            2. You must MERGE related lines to find the full context.
-            3. DATE FORMAT: Look for dates like DD/MM/YYYY (e.g., 02/04/2026).
-            4. AMOUNT FORMAT: Look for numbers with '-' (debit) or '+' (credit).
-               - Example: "-400.00" -> Amount: 400.00 (Debit)
-               - Example: "+52000.00" -> Amount: 52000.00 (Credit/Income)
-            5. VENDOR/DESC: The name is often on the line ABOVE or BELOW the date.
-
-            OUTPUT FORMAT:
-            Return ONLY a JSON Array of objects. No Markdown.
-            [{{ "date": "YYYY-MM-DD", "description": "Full Description", "amount": 0.00, "vendor": "Name" }}]
-
-            RAW TEXT TO PROCESS:
-            {text}
-            """
-        )
+        return round(abs(float(str(value).replace(",", ""))) * 100)
+    except (TypeError, ValueError):
+        return None
+
+
+def _amounts_in(text: str) -> Counter:
+    """Money amounts printed in a piece of statement text, in cents."""
+    return Counter(_cents(token) for token in MONEY_TOKEN.findall(text or ""))
+
 
-        chain = prompt | llm
-        response = await chain.ainvoke({"text": safe_text})
+def _dedupe_key(item: dict) -> tuple:
+    return (
+        str(item.get("date", "")).strip(),
+        str(item.get("description", "")).strip(),
+        str(item.get("amount", "")).strip(),
+        str(item.get("vendor", "")).strip(),
+    )
+
+
+async def _extract_chunk(chunk_text: str) -> list:
+    """
+    Uses AI to parse one chunk of messy PDF text into structured JSON.
+    Includes Rate Limit detection and Regex Fallback.
+    Answers are cached on disk, so a retried job never re-extracts a chunk.
+    """
+    cache_key = None
+    if settings.EXTRACTION_CACHE_ENABLED:
+        cache_key = chunk_key(EXTRACTION_PROMPT_VERSION, llm.model_name, chunk_text)
+        try:
+            cached = await run_in_threadpool(extraction_cache.get, cache_key)
+            if cached is not None:
+                return cached
+        except Exception as e:
+            print(f"⚠️ EXTRACTION CACHE SKIP: {str(e)}")
+
+    try:
+        chain = EXTRACTION_PROMPT | llm
+        # The JSON answer is about as long as the chunk itself
+        response = await llm_scheduler.run(
+            lambda: chain.ainvoke({"text": chunk_text}),
+            tokens=estimate_tokens(EXTRACTION_PROMPT.template, chunk_text, completion=len(chunk_text) // 4)
+        )
         content = response.content.strip()
-        
+
         # --- CLEANUP LOGIC ---
         content = content.replace("```json", "").replace("```", "").strip()
         start = content.find("[")
         end = content.rfind("]")
-        
+
         if start != -1 and end != -1:
             content = content[start : end + 1]
-            return json.loads(content)
+            items = json.loads(content)
+            # Only real LLM answers are cached; regex fallbacks are retried next time
+            if cache_key and isinstance(items, list):
+                try:
+                    await run_in_threadpool(extraction_cache.set, cache_key, items)
+                except Exception as e:
+                    print(f"⚠️ EXTRACTION CACHE SAVE SKIP: {str(e)}")
+            return items
         else:
             print(" AI did not return a valid JSON Array. Switching to Regex Fallback.")
             raise ValueError("Invalid JSON format")
 
+    # --- 1. GROQ RATE LIMIT (the scheduler already retried; the quota is exhausted) ---
+    except LLMRateLimitError as e:
+        wait_time = format_wait(e.retry_after)
+        print(f" Rate Limit Hit! Telling frontend to wait {wait_time}...")
+        raise HTTPException(
+            status_code=429,
+            detail=f"Groq Limit Reached. Cooldown: {wait_time}"
+        )
+
     except Exception as e:
-        error_msg = str(e)
-        print(f" Extraction Error: {error_msg}")
-
-        # --- 1. CATCH GROQ RATE LIMIT ---
-        if "rate_limit_exceeded" in error_msg or "429" in error_msg:
-            match = re.search(r"try again in ([0-9]+m[0-9]+\.?[0-9]*s)", error_msg)
-            wait_time = match.group(1) if match else "a few minutes"
-            
-            print(f" Rate Limit Hit! Telling frontend to wait {wait_time}...")
-            raise HTTPException(
-                status_code=429, 
-                detail=f"Groq Limit Reached. Cooldown: {wait_time}"
-            )
+        print(f" Extraction Error: {str(e)}")
 
         # --- 2. FALLBACK: REGEX (Spare Tire) ---
         print(" Switching to Regex Fallback...")
-        transactions = []
-        lines = raw_text.split('\n')
-        
-        # Regex for DD/MM/YYYY or DD-MM-YYYY
-        date_pattern = r"(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})"
-        money_pattern = r"([\d,]+\.\d{2})"
-
-        for line in lines:
-            date_match = re.search(date_pattern, line)
-            amount_matches = re.findall(money_pattern, line)
-            
-            if date_match and amount_matches:
-                raw_date = date_match.group(0)
-                
-                # --- FIX 2: Convert Date to ISO (YYYY-MM-DD) ---
-                # Pydantic requires YYYY-MM-DD, but banks give DD/MM/YYYY
-                try:
-                    # Normalize separators
-                    clean_date = raw_date.replace("-", "/")
-                    # Parse DD/MM/YYYY
-                    date_obj = datetime.strptime(clean_date, "%d/%m/%Y")
-                    # Convert to YYYY-MM-DD
-                    iso_date = date_obj.strftime("%Y-%m-%d")
-                except:
-                    # If conversion fails, keep original (and hope for the best)
-                    iso_date = raw_date
-
-                desc = line.replace(raw_date, "").replace(amount_matches[-1], "").strip()
-                desc = re.sub(r'[^\w\s]', '', desc) 
-                
-                transactions.append({
-                    "date": iso_date, # <--- Now sending correct format
-                    "description": desc or "Unknown Transaction",
-                    "amount": float(amount_matches[-1].replace(",", "")),
-                    "vendor": desc or "Unknown"
-                })
-        
+        transactions = regex_fallback(chunk_text)
+
         if len(transactions) > 0:
             print(f" Regex recovered {len(transactions)} items.")
-            return transactions
-        
-        return []
\ No newline at end of file
+
+        return transactions
+
+
+def regex_fallback(raw_text: str) -> list:
+    """Layout-agnostic line parser used when the LLM output is unusable."""
+    transactions, _ = parse_with_template(raw_text, GENERIC_TEMPLATE)
+    # Descriptions without punctuation, as this fallback has always produced them:
+    # stored rows, cached categories and vendor keys were built from that form
+    for item in transactions:
+        item["description"] = PUNCTUATION.sub("", item["description"]).strip() or "Unknown Transaction"
+    return transactions
+
+
+async def stream_to_transactions(pages: AsyncIterable[str], min_text_chars: int = 0) -> list:
+    """
+    Extracts transactions from a stream of page texts.
+    Each chunk is sent to the LLM as soon as its pages have arrived, so the
+    first chunks are being processed while later pages are still extracting.
+    Latency is bounded by the slowest chunk, not by the document length.
+    Statements in a known bank layout are parsed deterministically instead.
+    Raises ValueError, before any LLM call, when the document has fewer than
+    `min_text_chars` characters of text (an image scan).
+    """
+    chunker = StatementChunker()
+    tasks = []
+    overlaps = []
+    held_chunks = []  # Chunks waiting until the document is known to have real text
+    total_chars = 0
+    text_chars = 0
+    first_page = True
+    template = None
+    held_pages = []
+
+    def dispatch(chunks: List[StatementChunk]):
+        held_chunks.extend(chunks)
+        if text_chars < min_text_chars:
+            return
+        for chunk in held_chunks:
+            tasks.append(asyncio.create_task(_extract_chunk(chunk.text)))
+            overlaps.append(chunk.overlap)
+        held_chunks.clear()
+
+    try:
+        async for page_text in pages:
+            total_chars += len(page_text)
+            text_chars += len(page_text.strip())
+            # 🟢 FAST PATH: a known bank layout on page 1 means we can probably
+            # skip the LLM entirely, so hold pages back instead of chunking them.
+            if first_page:
+                template = detect_template(page_text)
+                first_page = False
+            if template:
+                held_pages.append(page_text)
+                continue
+            dispatch(chunker.feed_page(page_text))
+
+        # 🟢 CRITICAL FIX: Guard Clause for Empty PDFs
+        # If text is empty, it means the PDF is an image scan.
+        if text_chars < min_text_chars:
+            raise ValueError("No text found. This appears to be a scanned image PDF. OCR is required.")
+
+        if template:
+            transactions, confidence = parse_with_template(PAGE_BREAK.join(held_pages), template)
+            if transactions and confidence >= settings.TEMPLATE_MIN_CONFIDENCE:
+                print(f" Template '{template.name}' parsed {len(transactions)} items ({confidence:.0%} of rows). LLM skipped.")
+                return transactions
+            print(f" Template '{template.name}' only matched {confidence:.0%} of rows. Using LLM.")
+            for page_text in held_pages:
+                dispatch(chunker.feed_page(page_text))
+
+        dispatch(chunker.finish())
+
+        print(f" Extractor: Analyzing {total_chars} chars in {len(tasks)} chunks...")
+        chunk_results = await asyncio.gather(*tasks)
+    except BaseException:
+        # One chunk hit the rate limit (or the page stream failed): stop the rest
+        for task in tasks:
+            task.cancel()
+        raise
+
+    return merge_chunk_results(chunk_results, overlaps)
+
+
+async def _iter_pages(raw_text: str):
+    for page_text in raw_text.split(PAGE_BREAK):
+        yield page_text
+
+
+async def text_to_transactions(raw_text: str):
+    """
+    Uses AI to parse messy PDF text into structured JSON.
+    The text is split into page/line aligned chunks that are extracted concurrently.
+    """
+    return await stream_to_transactions(_iter_pages(raw_text))
@@ -1,18 +1,17 @@
 import pandas as pd
-from prophet import Prophet
-import logging
+from app.agents.forecast_engines import select_engine
+from app.agents.runway_simulator import simulate_from_forecast
 
-# Suppress Prophet's excessive logging
-logging.getLogger('cmdstanpy').setLevel(logging.WARNING)
-logging.getLogger('prophet').setLevel(logging.WARNING)
-
-def predict_runway(history_df: pd.DataFrame, months_to_forecast: int = 3):
+def predict_runway(history_df: pd.DataFrame, months_to_forecast: int = 3, simulate: bool = False):
     """
     Analyzes cash flow history to predict insolvency (Runway).
     
     Required Input Columns:
     - 'date': datetime objects or strings
     - 'balance': float (The account balance at the end of that day)
+
+    With simulate=True the result also carries a Monte Carlo 'simulation'
+    (insolvency-date percentiles and probability over the same window).
     """
     # 1. Data Validation
     if history_df.empty or len(history_df) < 5:
@@ -21,20 +20,18 @@ def predict_runway(history_df: pd.DataFrame, months_to_forecast: int = 3):
             "message": "Need at least 5 days of balance history to forecast."
         }
     
-    # 2. Prepare Data for Prophet (Strict Format: 'ds' for date, 'y' for value)
+    # 2. Prepare Data for the engine (Strict Format: 'ds' for date, 'y' for value)
     df = history_df.copy()
     df['ds'] = pd.to_datetime(df['date'])
     df['y'] = df['balance']
     
     # 3. Fit the Model (The "Learning" Phase)
-    # We disable yearly_seasonality because startups change too fast for annual cycles to matter
-    m = Prophet(yearly_seasonality=False, daily_seasonality=False)
-    m.add_seasonality(name='monthly', period=30.5, fourier_order=5) # Custom monthly cycle
-    m.fit(df)
+    # No yearly seasonality: startups change too fast for annual cycles to matter.
+    # Short histories use the NumPy engine; Prophet only when it has enough data.
+    engine = select_engine(len(df), weekly_seasonality=True, monthly_seasonality=True)
     
     # 4. Predict the Future
-    future = m.make_future_dataframe(periods=months_to_forecast * 30) 
-    forecast = m.predict(future)
+    forecast = engine.forecast(df, periods=months_to_forecast * 30)
     
     # 5. Find the "Crash Date" (When balance hits $0)
     # Filter for future dates only
@@ -46,17 +43,68 @@ def predict_runway(history_df: pd.DataFrame, months_to_forecast: int = 3):
     
     if not insolvency.empty:
         burn_date = insolvency.iloc[0]['ds'].strftime('%Y-%m-%d')
-        return {
+        result = {
             "status": "DANGER", 
             "runway_end_date": burn_date,
             "message": f"Projected insolvency date: {burn_date}"
         }
+    else:
+        # If we survive the forecast window
+        min_balance = future_forecast['yhat'].min()
+        result = {
+            "status": "SAFE", 
+            "lowest_projected_balance": round(min_balance, 2),
+            "message": f"Sustainable for at least {months_to_forecast} months."
+        }
+
+    # 6. Optional: the odds around that single line, from simulated paths
+    if simulate:
+        result["simulation"] = simulate_from_forecast(df[['ds', 'y']], forecast)
+    return result
+
+
+def runway_metrics(prophet_df: pd.DataFrame, forecast: pd.DataFrame) -> dict:
+    """
+    The "CFO" numbers for a daily balance series ('ds', 'y') and its 90-day
+    forecast: current balance, monthly burn, runway and chart data. Shared by
+    POST /forecast and the nightly forecast snapshots.
+    """
+    # Get the last actual balance
+    current_balance = prophet_df['y'].iloc[-1]
+    
+    # Get the predicted balance 30 days from now
+    future_30_days = forecast.iloc[-60]['yhat'] # Approx 30 days out
+    
+    # Monthly Burn Rate (How much we lose per month)
+    # If balance goes UP, burn rate is 0 (Profit)
+    burn_rate = current_balance - future_30_days
     
-    # If we survive the forecast window
-    min_balance = future_forecast['yhat'].min()
+    # Runway (Days until $0)
+    runway_days = "Infinite"
+    zero_date = "Never"
+    
+    if burn_rate > 0:
+        # Avoid division by zero
+        daily_burn = burn_rate / 30
+        days_left = int(current_balance / daily_burn)
+        runway_days = str(days_left)
+        
+        # Calculate exact date
+        last_date = prophet_df['ds'].max()
+        zero_date_obj = last_date + pd.Timedelta(days=days_left)
+        zero_date = zero_date_obj.strftime('%Y-%m-%d')
+
+    # Format Data for Chart
+    chart_data = forecast[['ds', 'yhat']].tail(90).to_dict(orient="records")
+    for d in chart_data:
+        d['ds'] = d['ds'].strftime('%Y-%m-%d')
+
     return {
-        "status": "SAFE", 
-        "lowest_projected_balance": round(min_balance, 2),
-        "message": f"Sustainable for at least {months_to_forecast} months."
+        "metrics": {
+            "current_balance": round(current_balance, 2),
+            "monthly_burn_rate": round(burn_rate, 2),
+            "runway_days": runway_days,
+            "zero_balance_date": zero_date
+        },
+        "chart_data": chart_data
     }
-    
\ No newline at end of file
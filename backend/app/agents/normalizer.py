@@ -1,92 +1,264 @@
-import uuid
+import asyncio
 import json
+from typing import Dict, List, Optional
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_groq import ChatGroq
-from langchain_core.documents import Document
 from app.core.config import settings
-from app.services.vector_store import get_vector_store
+from app.services.vector_store import get_vector_store, vector_store_manager, bulk_similarity_search
+from app.services.category_cache import category_cache, canonicalize_description
+from app.services.learning_buffer import learning_buffer
+from app.services.llm_scheduler import llm_scheduler, llm_tenant, estimate_tokens
+from app.services.singleflight import SingleFlight
 from fastapi.concurrency import run_in_threadpool # 🟢 1. IMPORT THIS
 
 # Initialize Fast LLM
 llm = ChatGroq(
-    temperature=0, 
+    temperature=0,
     model_name="llama-3.3-70b-versatile", # Active Model
     api_key=settings.GROQ_API_KEY
 )
 
+BATCH_PROMPT = ChatPromptTemplate.from_template(
+    """
+    You are an expert accountant. Categorize each bank transaction description below into ONE
+    standard accounting category (e.g., Software, Office Supplies, Travel, Payroll, Utility).
+
+    The input is a JSON object mapping a key to a description.
+    Return ONLY a JSON object mapping every key to its category name. No Markdown. No extra words.
+    Example: {{"1": "Software", "2": "Travel"}}
+
+    Transactions: {items}
+    """
+)
+
+# Coalesces concurrent categorizations of the same canonical description
+categorize_inflight = SingleFlight("normalizer.singleflight")
+
+def _cache_key(raw_description: str) -> str:
+    # Scoped to the tenant being served: one user's answers are never shown to another
+    return f"{llm_tenant.get()}:{canonicalize_description(raw_description)}"
+
+def _recall_filter() -> dict:
+    # Same scoping for the vector memory: learned categories carry their tenant
+    return {"tenant": llm_tenant.get()}
+
+def _recall_result(similar) -> Optional[dict]:
+    if similar and similar[0][1] > vector_store_manager.recall_threshold:
+        return {
+            "category": similar[0][0].metadata['category'],
+            "source": f"Memory Recall (Similarity: {similar[0][1]:.2f})",
+            "confidence": similar[0][1]
+        }
+    return None
+
+async def _memory_recall(vector_db, raw_description: str) -> Optional[dict]:
+    # 🟢 2. FIX: Run blocking DB call in a thread
+    # This prevents "Sync client is not available" error
+    try:
+        similar = await run_in_threadpool(
+            vector_db.similarity_search_with_score, raw_description, k=1, filter=_recall_filter()
+        )
+    except Exception as e:
+        vector_store_manager.report_failure(e)
+        raise
+    vector_store_manager.report_success()
+    return _recall_result(similar)
+
 async def normalize_transaction(raw_description: str):
+    # 🟢 0. In-process cache (repeat merchants never leave the process)
+    cache_key = _cache_key(raw_description)
+    cached = category_cache.get(cache_key)
+    if cached:
+        return cached
+
+    # 🟢 1. Identical descriptions categorized concurrently share one lookup
+    return await categorize_inflight.do(cache_key, lambda: _categorize_uncached(raw_description, cache_key))
+
+async def _categorize_uncached(raw_description: str, cache_key: str):
     # --- DEFENSIVE START: VECTOR DB ---
     vector_db = None
-    similar = []
-    
+
     try:
-        vector_db = get_vector_store()
-        # 🟢 2. FIX: Run blocking DB call in a thread
-        # This prevents "Sync client is not available" error
-        similar = await run_in_threadpool(vector_db.similarity_search_with_score, raw_description, k=1)
-        
-        if similar and similar[0][1] > 0.85:
-            return {
-                "category": similar[0][0].metadata['category'],
-                "source": f"Memory Recall (Similarity: {similar[0][1]:.2f})",
-                "confidence": similar[0][1]
-            }    
+        # First use (or a reconnect) opens the client: keep that off the event loop
+        vector_db = await run_in_threadpool(get_vector_store)
+        recalled = await _memory_recall(vector_db, raw_description)
+        if recalled:
+            category_cache.set(cache_key, recalled)
+            return recalled
     except Exception as e:
         # Just print error and move to AI (don't crash)
         print(f"⚠️ VECTOR DB SKIP: {str(e)}")
-        
+
     # --- DEFENSIVE END ---
 
     # 2. ASK THE LLM
     print(f"🤖 AI Reasoning: Categorizing '{raw_description}'...")
-    
+
     try:
         # Define Prompt
         prompt = ChatPromptTemplate.from_template(
             """
-            You are an expert accountant. Categorize this bank transaction description into ONE 
+            You are an expert accountant. Categorize this bank transaction description into ONE
             standard accounting category (e.g., Software, Office Supplies, Travel, Payroll, Utility).
             Return ONLY the category name. No periods. No extra words.
-            
+
             Transaction: {text}
             """
         )
         chain = prompt | llm
-        
-        # 🟢 3. Run AI Inference (This is already async, so we await it directly)
-        response = await chain.ainvoke({"text": raw_description})
+
+        # 🟢 3. Run AI Inference through the shared scheduler (quota, retries, fairness)
+        response = await llm_scheduler.run(
+            lambda: chain.ainvoke({"text": raw_description}),
+            tokens=estimate_tokens(prompt.template, raw_description, completion=10)
+        )
         category = response.content.strip()
 
-        # 3. Save to Memory (if successful)
-        if vector_db:
-            try:
-                doc = Document(
-                    page_content=raw_description,
-                    metadata={"category": category, "source": "ai-learned"}
-                )
-                # 🟢 4. Run blocking Add call in thread too
-                await run_in_threadpool(vector_db.add_documents, [doc])
-            except:
-                pass
-        
-        return {
+        # 3. Save to Memory (queued; written to the vector store in the background)
+        learning_buffer.add(raw_description, category, tenant=llm_tenant.get())
+
+        result = {
             "category": category,
             "source": "Llama 3 Inference",
-            "confidence": 0.7 
+            "confidence": 0.7
         }
+        category_cache.set(cache_key, result)
+        return result
 
     except Exception as e:
         print(f"❌ LLM ERROR: {str(e)}")
-        
+
         # --- FALLBACK LOGIC ---
         desc_lower = raw_description.lower()
         fallback_cat = "Uncategorized"
         if "transfer" in desc_lower: fallback_cat = "Transfer"
         elif "net" in desc_lower or "data" in desc_lower: fallback_cat = "Utilities"
         elif "food" in desc_lower or "restaurant" in desc_lower: fallback_cat = "Meals"
-        
+
         return {
-            "category": fallback_cat, 
-            "source": "Fallback Rule", 
+            "category": fallback_cat,
+            "source": "Fallback Rule",
             "confidence": 0.1
-        }
\ No newline at end of file
+        }
+
+async def _categorize_batch(descriptions: List[str]) -> Dict[str, str]:
+    """
+    Sends one structured prompt for a whole batch and parses the keyed JSON reply.
+    Keys that are missing or malformed are simply absent from the result.
+    """
+    keyed = {str(i): desc for i, desc in enumerate(descriptions, start=1)}
+
+    items = json.dumps(keyed, ensure_ascii=False)
+    chain = BATCH_PROMPT | llm
+    response = await llm_scheduler.run(
+        lambda: chain.ainvoke({"items": items}),
+        tokens=estimate_tokens(BATCH_PROMPT.template, items, completion=10 * len(keyed))
+    )
+
+    content = response.content.strip().replace("```json", "").replace("```", "").strip()
+    start = content.find("{")
+    end = content.rfind("}")
+    if start == -1 or end == -1:
+        raise ValueError("Batch categorization did not return a JSON object")
+
+    answers = json.loads(content[start : end + 1])
+    if not isinstance(answers, dict):
+        raise ValueError("Batch categorization did not return a JSON object")
+
+    results = {}
+    for key, desc in keyed.items():
+        category = answers.get(key)
+        if isinstance(category, str) and category.strip():
+            results[desc] = category.strip().rstrip(".")
+    return results
+
+async def normalize_transactions_batch(descriptions: List[str]) -> Dict[str, dict]:
+    """
+    Categorizes a whole statement with a handful of LLM calls instead of one per row.
+    Returns {description: {"category", "source", "confidence"}} for every unique description.
+    Descriptions sharing a canonical form are looked up and categorized once, and
+    keys another request is already categorizing are awaited, not asked again.
+    """
+    groups: Dict[str, List[str]] = {}
+    for desc in dict.fromkeys(descriptions):
+        groups.setdefault(_cache_key(desc), []).append(desc)
+
+    answered: Dict[str, dict] = {}  # canonical key -> result
+
+    # 0. In-process cache
+    for key in groups:
+        cached = category_cache.get(key)
+        if cached:
+            answered[key] = cached
+
+    # 1. Every miss has one owner across concurrent requests (see _categorize_keys)
+    pending = [key for key in groups if key not in answered]
+    if pending:
+        answered.update(await categorize_inflight.do_many(
+            pending, lambda keys: _categorize_keys({key: groups[key][0] for key in keys})
+        ))
+
+    return {desc: answered[key] for key, descs in groups.items() for desc in descs}
+
+async def _categorize_keys(representatives: Dict[str, str]) -> Dict[str, dict]:
+    """
+    Batch path behind normalize_transactions_batch for cache misses:
+    {cache key: description} -> {cache key: result}, with a result for every key.
+    Items a batch fails to answer are retried one by one.
+    """
+    answered: Dict[str, dict] = {}
+
+    # 1. Memory Recall: one embeddings request + one batched lookup for all cache misses
+    pending = list(representatives)
+    try:
+        recalled = await run_in_threadpool(
+            bulk_similarity_search, [representatives[key] for key in pending], filter=_recall_filter()
+        )
+        vector_store_manager.report_success()
+        for key, similar in zip(pending, recalled):
+            hit = _recall_result(similar)
+            if hit:
+                answered[key] = hit
+                category_cache.set(key, hit)
+    except Exception as e:
+        vector_store_manager.report_failure(e)
+        print(f"⚠️ VECTOR DB SKIP: {str(e)}")
+
+    misses = [key for key in pending if key not in answered]
+    if misses:
+        # 2. Ask the LLM, one prompt per batch (one representative description per key)
+        size = settings.NORMALIZER_BATCH_SIZE
+        batches = [misses[i : i + size] for i in range(0, len(misses), size)]
+        print(f"🤖 AI Reasoning: Categorizing {len(misses)} descriptions in {len(batches)} batches...")
+
+        answers = await asyncio.gather(
+            *(_categorize_batch([representatives[key] for key in batch]) for batch in batches),
+            return_exceptions=True
+        )
+
+        for batch, answer in zip(batches, answers):
+            if isinstance(answer, Exception):
+                print(f"❌ BATCH LLM ERROR: {str(answer)}")
+                continue
+            for key in batch:
+                desc = representatives[key]
+                if desc not in answer:
+                    continue
+                result = {"category": answer[desc], "source": "Llama 3 Inference", "confidence": 0.7}
+                answered[key] = result
+                category_cache.set(key, result)
+                # 3. Save to Memory (write-behind, flushed in batches)
+                learning_buffer.add(desc, answer[desc], tenant=llm_tenant.get())
+
+        # 4. Per-item retry for anything the batches didn't answer. Straight to
+        # _categorize_uncached: these keys are already ours in categorize_inflight.
+        leftovers = [key for key in misses if key not in answered]
+        if leftovers:
+            print(f"🔁 Retrying {len(leftovers)} unanswered descriptions one by one...")
+
+            retried = await asyncio.gather(
+                *(_categorize_uncached(representatives[key], key) for key in leftovers)
+            )
+            answered.update(zip(leftovers, retried))
+
+    return answered
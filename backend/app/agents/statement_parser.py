@@ -0,0 +1,198 @@
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Pattern, Tuple
+
+# 🟢 DETERMINISTIC FAST PATH
+# Known statement layouts are parsed with compiled regexes in a single pass over
+# the lines. The LLM extractor is only needed when no layout matches confidently.
+
+DATE_TOKEN = re.compile(r"\b(\d{1,2}[/-]\d{1,2}[/-]\d{2,4}|\d{1,2}[- ][A-Za-z]{3}[- ]\d{2,4}|\d{4}-\d{2}-\d{2})\b")
+MONEY_TOKEN = re.compile(r"[\d,]+\.\d{2}")
+
+# Summary / furniture lines that look like rows but are not transactions
+SUMMARY_LINE = re.compile(
+    r"total\s+money\s+(in|out)|opening\s+balance|closing\s+balance|statement\s+period|"
+    r"page\s+\d+\s+of|brought\s+forward|carried\s+forward|^\s*total\b",
+    re.IGNORECASE
+)
+
+MAX_CONTINUATION_LINES = 3
+
+
+@dataclass(frozen=True)
+class BankTemplate:
+    """
+    One statement layout.
+    `row` must define the named groups `date`, `desc` and `amount`
+    (optionally `balance`). Amounts are returned unsigned, like the LLM output.
+    """
+    name: str
+    fingerprints: Tuple[Pattern, ...]
+    row: Pattern
+    date_formats: Tuple[str, ...]
+    min_fingerprints: int = 2
+
+
+TEMPLATES: List[BankTemplate] = [
+    # Fintech app exports (Kuda / OPay / Moniepoint style):
+    # "02/04/2026  POS Purchase Shoprite Lekki  -400.00  51,600.00"
+    BankTemplate(
+        name="signed_amount_ddmmyyyy",
+        fingerprints=(
+            re.compile(r"money\s+in", re.IGNORECASE),
+            re.compile(r"money\s+out", re.IGNORECASE),
+            re.compile(r"\bbalance\b", re.IGNORECASE),
+            re.compile(r"date\s*/\s*time|trans(action)?\s+date", re.IGNORECASE),
+        ),
+        row=re.compile(
+            r"^(?P<date>\d{2}/\d{2}/\d{4})(?:\s+\d{1,2}:\d{2}(?::\d{2})?(?:\s*[AP]M)?)?\s+"
+            r"(?P<desc>.+?)\s+(?P<amount>[-+]\s?[\d,]+\.\d{2})(?:\s+(?P<balance>-?[\d,]+\.\d{2}))?\s*$",
+            re.IGNORECASE
+        ),
+        date_formats=("%d/%m/%Y",),
+    ),
+    # Traditional bank columns (GTBank / Access / Zenith style):
+    # "02-Apr-2026 02-Apr-2026 TRF FROM JOHN DOE 52,000.00 103,600.00"
+    BankTemplate(
+        name="debit_credit_ddmonyyyy",
+        fingerprints=(
+            re.compile(r"trans(action)?\.?\s+date", re.IGNORECASE),
+            re.compile(r"value\s+date", re.IGNORECASE),
+            re.compile(r"\bdebits?\b", re.IGNORECASE),
+            re.compile(r"\bcredits?\b", re.IGNORECASE),
+            re.compile(r"remarks|narration|description", re.IGNORECASE),
+        ),
+        row=re.compile(
+            r"^(?P<date>\d{2}-[A-Za-z]{3}-\d{2,4})\s+(?:\d{2}-[A-Za-z]{3}-\d{2,4}\s+)?"
+            r"(?P<desc>.+?)\s+(?P<amount>[\d,]+\.\d{2})\s+(?P<balance>-?[\d,]+\.\d{2})\s*$"
+        ),
+        date_formats=("%d-%b-%Y", "%d-%b-%y"),
+        min_fingerprints=3,
+    ),
+    # ISO dated exports: "2026-04-02  AWS *Web Services  1,500.00  48,500.00"
+    BankTemplate(
+        name="iso_date_amount_balance",
+        fingerprints=(
+            re.compile(r"(posting|transaction|booking)\s+date", re.IGNORECASE),
+            re.compile(r"\bdescription\b", re.IGNORECASE),
+            re.compile(r"\bamount\b", re.IGNORECASE),
+            re.compile(r"\bbalance\b", re.IGNORECASE),
+        ),
+        row=re.compile(
+            r"^(?P<date>\d{4}-\d{2}-\d{2})\s+(?P<desc>.+?)\s+(?P<amount>-?[\d,]+\.\d{2})"
+            r"(?:\s+(?P<balance>-?[\d,]+\.\d{2}))?\s*$"
+        ),
+        date_formats=("%Y-%m-%d",),
+        min_fingerprints=3,
+    ),
+]
+
+# Layout-agnostic fallback: a date somewhere on the line, the last money token
+# after it is the amount. Anything may follow it (references, a balance column).
+GENERIC_TEMPLATE = BankTemplate(
+    name="generic",
+    fingerprints=(),
+    row=re.compile(
+        r"^(?P<pre>.*?)(?P<date>\d{1,2}[/-]\d{1,2}[/-]\d{2,4})(?P<desc>.*)"
+        r"(?<![\d,])(?P<amount>[\d,]+\.\d{2})(?!\d)(?P<post>.*)$"
+    ),
+    date_formats=("%d/%m/%Y", "%d/%m/%y"),
+    min_fingerprints=0,
+)
+
+PUNCTUATION = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def detect_template(header_text: str) -> Optional[BankTemplate]:
+    """
+    Picks the layout whose header fingerprints best match the first page.
+    Returns None when no layout reaches its minimum number of fingerprints.
+    """
+    best, best_hits = None, 0
+    for template in TEMPLATES:
+        hits = sum(1 for fingerprint in template.fingerprints if fingerprint.search(header_text))
+        if hits >= template.min_fingerprints and hits > best_hits:
+            best, best_hits = template, hits
+    return best
+
+
+def _to_iso(raw_date: str, formats: Tuple[str, ...]) -> Optional[str]:
+    clean_date = raw_date.replace(" ", "-")
+    if "/" in formats[0]:
+        clean_date = clean_date.replace("-", "/")
+    for fmt in formats:
+        try:
+            return datetime.strptime(clean_date, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+def parse_with_template(text: str, template: BankTemplate) -> Tuple[list, float]:
+    """
+    Parses statement text with one layout in a single pass.
+    Lines that follow a row and carry no amount are merged into its description
+    (multi-line narrations). Returns (transactions, confidence) where confidence
+    is the share of row-like lines the layout could parse.
+    """
+    transactions = []
+    candidates = 0
+    parsed = 0
+    current = None
+    continuation = 0
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            current = None
+            continue
+        if SUMMARY_LINE.search(line):
+            current = None
+            continue
+        # Column header repeated at the top of every page
+        if sum(1 for fingerprint in template.fingerprints if fingerprint.search(line)) >= 2:
+            current = None
+            continue
+
+        looks_like_row = DATE_TOKEN.search(line) is not None and MONEY_TOKEN.search(line) is not None
+        if looks_like_row:
+            candidates += 1
+
+        match = template.row.match(line)
+        if match:
+            raw_date = match.group("date")
+            iso_date = _to_iso(raw_date, template.date_formats)
+            if iso_date is None and template is not GENERIC_TEMPLATE:
+                current = None
+                continue
+
+            desc = match.group("desc")
+            if template is GENERIC_TEMPLATE:
+                desc = f"{match.group('pre')} {desc} {match.group('post')}"
+            desc = _SPACES.sub(" ", desc).strip()
+
+            current = {
+                "date": iso_date or raw_date,
+                "description": desc or "Unknown Transaction",
+                "amount": abs(float(match.group("amount").replace(",", "").replace(" ", ""))),
+                "vendor": PUNCTUATION.sub("", desc).strip() or "Unknown",
+            }
+            transactions.append(current)
+            continuation = 0
+            if looks_like_row:
+                parsed += 1
+            continue
+
+        # Narration wrapped onto the next line(s)
+        if current is not None and not looks_like_row and continuation < MAX_CONTINUATION_LINES \
+                and not MONEY_TOKEN.search(line):
+            current["description"] = f"{current['description']} {line}"
+            current["vendor"] = PUNCTUATION.sub("", current["description"]).strip() or "Unknown"
+            continuation += 1
+        else:
+            current = None
+
+    confidence = parsed / candidates if candidates else 0.0
+    return transactions, confidence
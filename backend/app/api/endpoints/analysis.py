@@ -1,13 +1,17 @@
 from fastapi import APIRouter
 from typing import List
 import pandas as pd
-from prophet import Prophet
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import settings
 from app.schemas.transaction import TransactionOutput
+from app.services.forecast_pool import forecast_series
+from app.agents.forecaster import runway_metrics
+from app.agents.runway_simulator import category_shocks, simulate_from_forecast
 
 router = APIRouter()
 
 @router.post("/forecast")
-async def generate_forecast(history: List[TransactionOutput]):
+async def generate_forecast(history: List[TransactionOutput], simulate: bool = False):
     # 1. Convert to DataFrame
     df = pd.DataFrame([t.dict() for t in history])
     
@@ -26,52 +30,26 @@ async def generate_forecast(history: List[TransactionOutput]):
     # Rename for Prophet
     prophet_df = daily_change.rename(columns={'date': 'ds', 'balance': 'y'})
 
-    # 3. Train Prophet
-    m = Prophet(yearly_seasonality=False, weekly_seasonality=False, daily_seasonality=False)
-    m.fit(prophet_df)
+    # 3 + 4. Fit and Predict Future in the forecasting pool (cached per series).
+    # One fit serves both the 90-day metrics and the longer simulation horizon.
+    periods = max(90, settings.RUNWAY_SIMULATION_DAYS) if simulate else 90
+    forecast = await forecast_series(prophet_df, periods=periods)
     
-    # 4. Predict Future (90 Days)
-    future = m.make_future_dataframe(periods=90)
-    forecast = m.predict(future)
-    
-    # 5. CALCULATE METRICS (The "CFO" Logic)
-    
-    # Get the last actual balance
-    current_balance = prophet_df['y'].iloc[-1]
-    
-    # Get the predicted balance 30 days from now
-    future_30_days = forecast.iloc[-60]['yhat'] # Approx 30 days out
-    
-    # Monthly Burn Rate (How much we lose per month)
-    # If balance goes UP, burn rate is 0 (Profit)
-    burn_rate = current_balance - future_30_days
-    
-    # Runway (Days until $0)
-    runway_days = "Infinite"
-    zero_date = "Never"
-    
-    if burn_rate > 0:
-        # Avoid division by zero
-        daily_burn = burn_rate / 30
-        days_left = int(current_balance / daily_burn)
-        runway_days = str(days_left)
-        
-        # Calculate exact date
-        last_date = df['date'].max()
-        zero_date_obj = last_date + pd.Timedelta(days=days_left)
-        zero_date = zero_date_obj.strftime('%Y-%m-%d')
+    # 5 + 6. CFO metrics and chart data
+    response = runway_metrics(prophet_df, forecast.iloc[: len(prophet_df) + 90])
+
+    # 7. Optional Monte Carlo runway: noise drawn per spend category over a longer horizon
+    if simulate:
+        long_forecast = forecast.iloc[: len(prophet_df) + settings.RUNWAY_SIMULATION_DAYS]
+        response["simulation"] = await run_in_threadpool(_simulate_runway, df, prophet_df, long_forecast)
+
+    return response
 
-    # 6. Format Data for Chart
-    chart_data = forecast[['ds', 'yhat']].tail(90).to_dict(orient="records")
-    for d in chart_data:
-        d['ds'] = d['ds'].strftime('%Y-%m-%d')
 
-    return {
-        "metrics": {
-            "current_balance": round(current_balance, 2),
-            "monthly_burn_rate": round(burn_rate, 2),
-            "runway_days": runway_days,
-            "zero_balance_date": zero_date
-        },
-        "chart_data": chart_data
-    }
\ No newline at end of file
+def _simulate_runway(df: pd.DataFrame, prophet_df: pd.DataFrame, forecast: pd.DataFrame) -> dict:
+    """Category noise pool + Monte Carlo paths. CPU-bound; runs in the threadpool."""
+    by_category = df.pivot_table(index='date', columns='category', values='amount', aggfunc='sum')
+    # Quiet days count too: a category with nothing on a day contributed 0 that day
+    by_category = by_category.reindex(pd.date_range(by_category.index.min(), by_category.index.max()))
+    shocks = category_shocks(by_category)
+    return simulate_from_forecast(prophet_df, forecast, shocks)
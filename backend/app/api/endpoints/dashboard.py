@@ -8,6 +8,8 @@ from app.api.deps import get_current_user
 from app.models.user import User
 from app.models.transactions import Transaction
 from app.models.audit import AuditLog 
+from app.models.forecast_snapshot import ForecastSnapshot
+from app.models.daily_balance import DailyBalance
 # Import schemas to ensure data is formatted correctly for the frontend
 # (Assuming you have these, otherwise generic dicts will work)
 
@@ -39,27 +41,25 @@ def get_dashboard_stats(
     # 1. Calculate Date Range (Last 30 Days)
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
     
-    # 2. Fetch User's Transactions
-    txs = db.query(Transaction).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.date >= thirty_days_ago
-    ).all()
+    # 2. Per-day totals from the daily_balances rollup: one indexed range scan
+    daily = db.query(
+        DailyBalance.date,
+        DailyBalance.net_change,
+        DailyBalance.positive_total
+    ).filter(
+        DailyBalance.user_id == current_user.id,
+        DailyBalance.date >= thirty_days_ago
+    ).order_by(DailyBalance.date).all()
 
     # 3. Calculate Metrics
-    total_spend = sum(t.amount for t in txs if t.amount > 0) 
+    total_spend = sum(spend for _, _, spend in daily)
     burn_rate = total_spend  
     
     current_balance = 50000 - total_spend 
     runway_days = int((current_balance / burn_rate) * 30) if burn_rate > 0 else 999
 
-    # 4. Prepare Chart Data
-    chart_data = {}
-    for t in txs:
-        # Format as YYYY-MM-DD for the new Recharts component
-        date_str = t.date.strftime("%Y-%m-%d") 
-        chart_data[date_str] = chart_data.get(date_str, 0) + t.amount
-    
-    formatted_chart = [{"date": k, "balance": v} for k, v in chart_data.items()]
+    # 4. Prepare Chart Data (YYYY-MM-DD for the Recharts component)
+    formatted_chart = [{"date": day.strftime("%Y-%m-%d"), "balance": net} for day, net, _ in daily]
 
     # 5. Get Recent Alerts
     alerts = db.query(Transaction).filter(
@@ -67,6 +67,10 @@ def get_dashboard_stats(
         Transaction.is_anomaly == True
     ).order_by(Transaction.date.desc()).limit(5).all()
 
+    # 6. Precomputed runway forecast (nightly job), if one exists yet
+    snapshot = db.query(ForecastSnapshot).filter(ForecastSnapshot.user_id == current_user.id).first()
+    forecast = {**snapshot.result, "computed_at": snapshot.computed_at} if snapshot else None
+
     return {
         "metrics": {
             "balance": current_balance, 
@@ -74,7 +78,8 @@ def get_dashboard_stats(
             "runway": runway_days
         }, 
         "chart": formatted_chart, 
-        "alerts": alerts
+        "alerts": alerts,
+        "forecast": forecast
     }
 
 # 🟢 3. GET SINGLE AUDIT LOG
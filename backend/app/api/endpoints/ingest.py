@@ -1,54 +1,76 @@
 from fastapi import APIRouter, UploadFile, File, Form, Depends, BackgroundTasks
 from fastapi.encoders import jsonable_encoder
-from typing import List
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Tuple
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import get_db, SessionLocal
 from app.api.deps import check_subscription_tier
 from app.models.audit import AuditLog
 from app.core.mail import send_notification_email
 from datetime import datetime
+import asyncio
+import os
 
-from app.agents.extractor import text_to_transactions
+from app.agents.extractor import stream_to_transactions
 from app.schemas.transaction import TransactionInput
 # Import the shared logic from the file we just fixed
 from app.api.endpoints.transactions import run_ai_analysis 
-
-import pdfplumber
-import io
+from app.services.ingestion import spool_upload, iter_pdf_pages
+from app.services.structured_import import STRUCTURED_FORMATS, sniff_format, load_structured_transactions
+from app.services.upload_cache import find_reusable_audit, clone_audit, evict_stale_entries
+from app.services.llm_scheduler import llm_tenant
+from app.services.vendor_stats import vendor_key, load_vendor_baselines, store_analyzed_transactions
+from app.services.anomaly_state import load_scorer, save_scorer
+from app.services.duplicate_detector import find_duplicates
 
 router = APIRouter()
 
-async def process_file_background(audit_id: int, file_content: bytes, filename: str, db: Session, email: str):
+async def process_file_background(audit_id: int, path: str, filename: str, email: str):
     print(f"🚀 Starting background process for {filename}")
+    # 🟢 Own session: the request-scoped one is closed before background tasks run
+    db = SessionLocal()
     try:
-        # 1. Extract Text
-        text = ""
-        with pdfplumber.open(io.BytesIO(file_content)) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() or ""
-        
-        # 🟢 CRITICAL FIX: Guard Clause for Empty PDFs
-        # If text is empty, it means the PDF is an image scan.
-        if len(text.strip()) < 50:
-            raise ValueError("No text found. This appears to be a scanned image PDF. OCR is required.")
-
-        # 2. Run Extractor Agent
-        print(f"👀 Extractor: Analyzing {len(text)} chars...")
-        structured_data = await text_to_transactions(text)
-        
-        if not structured_data:
-             raise ValueError("AI could not find any transactions in the document.")
+        # 🟢 0. Structured exports (CSV / OFX / XLSX) skip text extraction and the LLM
+        file_format = sniff_format(path, filename)
 
-        # 3. Prepare Inputs
-        tx_inputs = [TransactionInput(**item) for item in structured_data]
-        
-        # 4. Run AI Analysis
-        final_report = await run_ai_analysis(tx_inputs)
+        if file_format in STRUCTURED_FORMATS:
+            tx_inputs = await run_in_threadpool(load_structured_transactions, path, file_format)
+            print(f"📄 {file_format.upper()} import: {len(tx_inputs)} rows from {filename}")
+            if not tx_inputs:
+                raise ValueError(f"No transactions found in the {file_format.upper()} file.")
+        else:
+            # 1 + 2. Extract Text and run the Extractor Agent as one pipeline:
+            # chunks go to the LLM while later pages are still being extracted.
+            # Scanned (image-only) PDFs are rejected before any LLM call.
+            structured_data = await stream_to_transactions(iter_pdf_pages(path), min_text_chars=50)
+
+            if not structured_data:
+                 raise ValueError("AI could not find any transactions in the document.")
+
+            # 3. Prepare Inputs
+            tx_inputs = [TransactionInput(**item) for item in structured_data]
 
-        # 5. Update Database
         # Re-fetch audit to attach to current session
         audit = db.query(AuditLog).filter(AuditLog.id == audit_id).first()
+
+        # 4. Run AI Analysis against the user's stored per-vendor baselines
+        # and streaming anomaly state (only the vendors in this statement are read)
+        baselines, scorer = None, None
         if audit:
+            vendors = [vendor_key(t.vendor) for t in tx_inputs]
+            baselines = await run_in_threadpool(load_vendor_baselines, db, audit.user_id, vendors)
+            scorer = await run_in_threadpool(load_scorer, db, audit.user_id, vendors)
+        # Duplicates inside the file and against the user's stored history
+        duplicates = await run_in_threadpool(find_duplicates, db, audit.user_id if audit else None, tx_inputs)
+        final_report = await run_ai_analysis(tx_inputs, baselines, scorer, duplicates)
+
+        # 5. Update Database
+        if audit:
+            # Store the analyzed rows; this also folds them into the vendor statistics
+            await run_in_threadpool(store_analyzed_transactions, db, audit.user_id, final_report, audit_id=audit.id)
+            await run_in_threadpool(save_scorer, db, audit.user_id, scorer)
+
             audit.status = "completed"
             
             # Convert objects to JSON-safe format
@@ -60,6 +82,9 @@ async def process_file_background(audit_id: int, file_content: bytes, filename:
             anomalies = [t for t in final_report if t.is_anomaly]
             audit.risk_score = min(100, len(anomalies) * 20)
 
+            # This audit is now a re-upload cache entry; keep the user's cache bounded
+            await run_in_threadpool(evict_stale_entries, db, audit.user_id)
+
             db.commit()
         
         # 6. Email User
@@ -75,6 +100,23 @@ async def process_file_background(audit_id: int, file_content: bytes, filename:
             audit.status = "failed"
             # Optional: You can save the error message to a 'details' column if you have one
             db.commit()
+    finally:
+        db.close()
+        os.unlink(path)
+
+async def process_uploads_background(jobs: List[Tuple[int, str, str]], email: str, user_id: int):
+    """
+    Processes every file of one upload concurrently (bounded), each under its own AuditLog.
+    """
+    # LLM calls of all these files share one fair-queue slot with the user's other work
+    llm_tenant.set(str(user_id))
+    file_sem = asyncio.Semaphore(settings.INGEST_FILE_CONCURRENCY)
+
+    async def run_one(audit_id: int, path: str, filename: str):
+        async with file_sem:
+            await process_file_background(audit_id, path, filename, email)
+
+    await asyncio.gather(*(run_one(*job) for job in jobs))
 
 @router.post("/universal")
 async def ingest_anything(
@@ -84,16 +126,49 @@ async def ingest_anything(
     tier: dict = Depends(check_subscription_tier)
 ):
     user = tier["user"]
-    file = files[0]
-    content = await file.read() 
 
-    # 1. Create 'Processing' Log
-    audit = AuditLog(user_id=user.id, filename=file.filename, status="processing")
-    db.add(audit)
+    # 1. Stream every file to disk (fixed-size chunks, size-capped, hashed on the way)
+    spooled = []
+    try:
+        for file in files:
+            path, content_hash = await spool_upload(file)
+            spooled.append((path, content_hash, file.filename))
+    except BaseException:
+        for path, _, _ in spooled:
+            os.unlink(path)
+        raise
+
+    # 2. Create one Log per file. Files this user already had audited are
+    # answered from the previous results instead of being processed again.
+    audits, jobs = [], []
+    for path, content_hash, filename in spooled:
+        cached = find_reusable_audit(db, user.id, content_hash)
+        if cached:
+            print(f"♻️ Reusing audit {cached.id} for re-uploaded {filename}")
+            audit = clone_audit(cached, filename)
+            os.unlink(path)
+        else:
+            audit = AuditLog(user_id=user.id, filename=filename, status="processing", content_hash=content_hash)
+            jobs.append((audit, path, filename))
+        audits.append(audit)
+
+    db.add_all(audits)
     db.commit()
-    db.refresh(audit)
+    for audit in audits:
+        db.refresh(audit)
 
-    # 2. Hand off to background task
-    background_tasks.add_task(process_file_background, audit.id, content, file.filename, db, user.email)
+    # 3. Hand off to background task
+    if jobs:
+        background_tasks.add_task(
+            process_uploads_background,
+            [(audit.id, path, filename) for audit, path, filename in jobs],
+            user.email,
+            user.id
+        )
 
-    return {"status": "processing", "message": "Upload started", "audit_id": audit.id}
\ No newline at end of file
+    return {
+        "status": "processing" if jobs else "completed",
+        "message": f"Upload started ({len(jobs)} new, {len(audits) - len(jobs)} reused)",
+        "audit_id": audits[0].id,
+        "audit_ids": [audit.id for audit in audits]
+    }
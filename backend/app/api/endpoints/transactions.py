@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, BackgroundTasks
-from typing import List
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Optional
 import asyncio
 from sqlalchemy.orm import Session
 from app.core.database import get_db
@@ -8,18 +9,20 @@ from app.models.user import User
 from app.models.audit import AuditLog 
 from app.schemas.transaction import TransactionInput, TransactionOutput
 from app.core.mail import send_notification_email
-from app.agents.normalizer import normalize_transaction
-from app.agents.auditor import audit_transaction
+from app.agents.normalizer import normalize_transaction, normalize_transactions_batch
+from app.agents.auditor import audit_transaction, audit_transactions_batch, vendor_baselines
+from app.agents.anomaly_engine import StreamingAnomalyScorer, combine_audits
+from app.services.llm_scheduler import llm_tenant
+from app.services.vendor_stats import vendor_key, load_vendor_baselines
+from app.services.anomaly_state import load_scorer
+from app.services.duplicate_detector import DuplicateFinding, find_duplicates, flag_duplicate
 import pandas as pd
 
-# Mock History
-MOCK_HISTORY_DF = pd.DataFrame([
-    {"vendor": "AWS", "amount": 50.00},
-    {"vendor": "Netflix", "amount": 15.00},
-])
+# Used when no user history is passed in: every vendor is new
+EMPTY_HISTORY_DF = pd.DataFrame(columns=["vendor", "amount"])
+EMPTY_BASELINES = vendor_baselines(EMPTY_HISTORY_DF)
 
 router = APIRouter()
-SEM = asyncio.Semaphore(3)
 
 # 🟢 CONFIG: Phrases that indicate a summary line, not a real transaction
 IGNORE_PHRASES = [
@@ -32,32 +35,34 @@ IGNORE_PHRASES = [
     "Brought Forward"
 ]
 
-async def process_single_transaction(txn: TransactionInput) -> TransactionOutput:
-    async with SEM:
-        try:
-            # Normalize Description
+async def process_single_transaction(txn: TransactionInput, category_data=None, audit_result=None) -> TransactionOutput:
+    # LLM concurrency is bounded by the shared scheduler inside the normalizer
+    try:
+        # Normalize Description (unless the batch categorizer already did)
+        if category_data is None:
             category_data = await normalize_transaction(txn.description)
-            
-            if isinstance(category_data, dict):
-                category = category_data.get("category", "Uncategorized")
-                source = category_data.get("source", "Unknown")
-                confidence = category_data.get("confidence", 0.0)
-            else:
-                category = str(category_data)
-                source = "Legacy System"
-                confidence = 1.0
-        except Exception as e:
-            print(f"⚠️ AI Error for '{txn.description}': {e}")
-            category = "System Error"
-            source = "Fallback"
-            confidence = 0.0
+        
+        if isinstance(category_data, dict):
+            category = category_data.get("category", "Uncategorized")
+            source = category_data.get("source", "Unknown")
+            confidence = category_data.get("confidence", 0.0)
+        else:
+            category = str(category_data)
+            source = "Legacy System"
+            confidence = 1.0
+    except Exception as e:
+        print(f"⚠️ AI Error for '{txn.description}': {e}")
+        category = "System Error"
+        source = "Fallback"
+        confidence = 0.0
 
-    # Auditor Logic
-    audit_result = audit_transaction(
-        current_amount=txn.amount, 
-        vendor=txn.vendor if txn.vendor else "Unknown", 
-        history_df=MOCK_HISTORY_DF
-    )
+    # Auditor Logic (unless the batch auditor already did)
+    if audit_result is None:
+        audit_result = audit_transaction(
+            current_amount=txn.amount, 
+            vendor=txn.vendor if txn.vendor else "Unknown", 
+            history_df=EMPTY_HISTORY_DF
+        )
 
     return TransactionOutput(
         date=txn.date,
@@ -72,8 +77,50 @@ async def process_single_transaction(txn: TransactionInput) -> TransactionOutput
         audit_reason=audit_result.get("note", "None")
     )
 
-async def run_ai_analysis(transactions: List[TransactionInput]) -> List[TransactionOutput]:
-    tasks = [process_single_transaction(txn) for txn in transactions]
+async def _in_date_order(transactions: List[TransactionInput]):
+    for txn in sorted(transactions, key=lambda t: t.date):
+        yield txn
+
+async def run_ai_analysis(
+    transactions: List[TransactionInput],
+    baselines: pd.DataFrame = None,
+    scorer: StreamingAnomalyScorer = None,
+    duplicates: List[Optional[DuplicateFinding]] = None
+) -> List[TransactionOutput]:
+    """
+    Categorizes and audits a statement. `baselines` are the user's per-vendor
+    statistics (see services.vendor_stats.load_vendor_baselines); `scorer` is the
+    user's streaming anomaly engine, updated in place as rows are scored;
+    `duplicates` holds one duplicate finding (or None) per row
+    (see services.duplicate_detector.find_duplicates).
+    """
+    # 🟢 Categorize the whole statement in batches (LLM calls scale with batches, not rows)
+    try:
+        categories = await normalize_transactions_batch([txn.description for txn in transactions])
+    except Exception as e:
+        print(f"⚠️ Batch categorization failed, falling back to per-row: {e}")
+        categories = {}
+
+    # 🟢 Audit the whole statement in one vectorized pass
+    audits = audit_transactions_batch(
+        [txn.amount for txn in transactions],
+        [vendor_key(txn.vendor) for txn in transactions],
+        baselines=baselines if baselines is not None else EMPTY_BASELINES
+    )
+
+    # 🟢 Streaming engine: drift, timing and new-vendor bursts, scored in date order
+    if scorer is not None:
+        streamed = {id(txn): result async for txn, result in scorer.score_stream(_in_date_order(transactions))}
+        audits = [combine_audits(audit, streamed[id(txn)]) for txn, audit in zip(transactions, audits)]
+
+    # 🟢 Double charges / overlapping statements
+    if duplicates is not None:
+        audits = [flag_duplicate(audit, note) for audit, note in zip(audits, duplicates)]
+
+    tasks = [
+        process_single_transaction(txn, categories.get(txn.description), audit)
+        for txn, audit in zip(transactions, audits)
+    ]
     results = await asyncio.gather(*tasks)
     return results
 
@@ -92,8 +139,14 @@ async def analyze_transactions(
 
     print(f"🚀 Processing {len(clean_transactions)} valid items for {current_user.email} (filtered out {len(transactions) - len(clean_transactions)} summaries)...")
     
-    # 🟢 2. Analyze only the clean data
-    results = await run_ai_analysis(clean_transactions)
+    # 🟢 2. Analyze only the clean data (LLM calls are queued fairly per user)
+    llm_tenant.set(str(current_user.id))
+    vendors = [vendor_key(t.vendor) for t in clean_transactions]
+    baselines = await run_in_threadpool(load_vendor_baselines, db, current_user.id, vendors)
+    # Manual analysis isn't stored, so the engine's updated state is discarded
+    scorer = await run_in_threadpool(load_scorer, db, current_user.id, vendors)
+    duplicates = await run_in_threadpool(find_duplicates, db, current_user.id, clean_transactions)
+    results = await run_ai_analysis(clean_transactions, baselines, scorer, duplicates)
     
     # Log the activity
     log_entry = AuditLog(
@@ -1,5 +1,7 @@
 import os
 from celery import Celery
+from celery.schedules import crontab
+from app.core.config import settings
 from ssl import CERT_REQUIRED
 
 # Load Env Vars
@@ -9,7 +11,8 @@ BACKEND_URL = os.getenv("CELERY_RESULT_BACKEND")
 celery_app = Celery(
     "ledger_guard_worker",
     broker=BROKER_URL,
-    backend=BACKEND_URL
+    backend=BACKEND_URL,
+    include=["app.tasks"]
 )
 
 # CRITICAL FOR UPSTASH:
@@ -24,4 +27,13 @@ celery_app.conf.update(
     task_serializer='json',
     result_serializer='json',
     accept_content=['json'],
-)
\ No newline at end of file
+)
+
+# 🟢 NIGHTLY JOBS (run `celery -A app.core.celery_app beat` next to the workers)
+celery_app.conf.beat_schedule = {
+    "nightly-forecasts": {
+        "task": "forecasts.refresh_all",
+        "schedule": crontab(hour=settings.FORECAST_NIGHTLY_HOUR, minute=0),
+    },
+}
+celery_app.conf.timezone = "UTC"
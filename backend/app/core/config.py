@@ -28,6 +28,94 @@ class Settings(BaseSettings):
     PINECONE_API_KEY: Optional[str] = None
     PINECONE_INDEX_NAME: Optional[str] = None
     REDIS_URL: Optional[str] = None
+    METRICS_TOKEN: Optional[str] = None  # Required in X-Metrics-Token for GET /metrics (unset = endpoint disabled)
+
+    # 🟢 PDF EXTRACTION ENGINE
+    # Number of worker processes that extract pages in parallel (None = CPU count)
+    PDF_WORKERS: Optional[int] = None
+    # Seconds of extraction work a single page may take before the document fails
+    PDF_PAGE_TIMEOUT: float = 30.0
+    # Pages of one document queued on the pool at once (None = PDF_WORKERS)
+    PDF_PAGES_IN_FLIGHT: Optional[int] = None
+
+    # 🟢 CHUNKED EXTRACTOR
+    EXTRACT_CHUNK_CHARS: int = 6000         # Max size of one LLM extraction prompt body
+    EXTRACT_CHUNK_OVERLAP_LINES: int = 3    # Lines repeated at each seam so split entries survive
+    TEMPLATE_MIN_CONFIDENCE: float = 0.9    # Share of rows a bank template must parse to skip the LLM
+    EXTRACTION_CACHE_ENABLED: bool = True   # Reuse parsed LLM answers for chunks seen before
+    EXTRACTION_CACHE_PATH: str = "./extraction_cache.db"
+    EXTRACTION_CACHE_MAX_ENTRIES: int = 100000
+    EXTRACTION_CACHE_VERSION_GRACE_SECONDS: int = 24 * 60 * 60  # Other prompt versions' entries kept while used this recently
+
+    # 🟢 LLM SCHEDULER (shared by the extractor and the normalizer; match your Groq plan)
+    LLM_REQUESTS_PER_MINUTE: int = 30
+    LLM_TOKENS_PER_MINUTE: int = 12000
+    LLM_INITIAL_CONCURRENCY: int = 3        # Starting point; adapts between MIN and MAX
+    LLM_MIN_CONCURRENCY: int = 1
+    LLM_MAX_CONCURRENCY: int = 16
+    LLM_LATENCY_TARGET_SECONDS: float = 20.0  # Slower calls shrink the concurrency limit
+    LLM_MAX_RETRIES: int = 4                # Retries for rate-limited / transient failures
+    LLM_BACKOFF_BASE_SECONDS: float = 1.0   # Doubles per retry, with jitter
+
+    # 🟢 VECTOR STORE CLIENTS
+    # "pinecone", "local" (in-process index, no network) or "auto" (Pinecone if its keys are set)
+    VECTOR_BACKEND: str = "auto"
+    LOCAL_VECTOR_DIR: str = "./vector_index"
+    LOCAL_EMBEDDING_MODEL: Optional[str] = None  # sentence-transformers model; None = built-in hashing embedder
+    LOCAL_EMBEDDING_DIM: int = 256
+    VECTOR_RECALL_THRESHOLD: float = 0.85   # Min similarity to reuse a remembered category (OpenAI / sentence-transformers)
+    HASHING_RECALL_THRESHOLD: float = 0.93  # Same, for the hashing embedder: a shared "POS PURCHASE WEB ... LAGOS NG" frame alone scores ~0.86
+    VECTOR_STORE_POOL_THREADS: int = 8      # Pinecone connection pool size
+    VECTOR_STORE_RETRY_SECONDS: int = 30    # Wait after a failed connect before trying again
+    VECTOR_STORE_MAX_FAILURES: int = 5      # Consecutive errors before the index is re-checked
+
+    # 🟢 BATCH CATEGORIZATION
+    NORMALIZER_BATCH_SIZE: int = 40         # Descriptions per LLM categorization call
+    CATEGORY_CACHE_SIZE: int = 50000        # Canonical descriptions kept in the in-process cache
+    CATEGORY_CACHE_TTL_SECONDS: int = 6 * 60 * 60
+
+    # 🟢 STREAMING ANOMALY ENGINE
+    ANOMALY_EWMA_ALPHA: float = 0.1         # Weight of the newest observation in the running averages
+    ANOMALY_WARMUP: int = 3                 # Observations per vendor before amount/timing are scored
+    ANOMALY_TENANT_WARMUP: int = 100        # Transactions per tenant before new-vendor bursts are scored
+    ANOMALY_NEW_VENDOR_BURST: int = 5       # First-seen vendors per day that count as normal
+    ANOMALY_ALERT_SCORE: float = 0.6        # Streaming risk at which a row is flagged
+
+    # 🟢 DUPLICATE DETECTION
+    DUPLICATE_WINDOW_DAYS: int = 3          # Same vendor + amount this close together is a possible duplicate
+    DUPLICATE_RISK_SCORE: float = 0.8           # Repeated inside one statement
+    DUPLICATE_HISTORY_RISK_SCORE: float = 0.5   # Matches an earlier upload (often an overlapping statement)
+
+    # 🟢 FORECASTING
+    FORECAST_ENGINE: str = "auto"           # "fast" (NumPy), "prophet", or "auto"
+    FORECAST_PROPHET_MIN_POINTS: int = 180  # "auto" uses Prophet from this many days of history
+    FORECAST_WORKERS: int = 2               # Processes fitting models off the event loop
+    FORECAST_QUEUE_SIZE: int = 16           # Jobs waiting/running before requests get a 503
+    FORECAST_CACHE_SIZE: int = 1000         # Forecast results kept per process
+    FORECAST_CACHE_TTL_SECONDS: int = 6 * 60 * 60
+    FORECAST_MODEL_DIR: str = "./forecast_models"  # Saved Prophet fits, for warm starts
+    FORECAST_MODEL_PREFIX_DAYS: int = 60    # Opening days of a series that identify its saved model
+    FORECAST_MODEL_TTL_DAYS: int = 30       # Saved models unused this long are deleted
+    FORECAST_MODEL_MAX_FILES: int = 10000   # ...and only the most recently used N are kept
+    RUNWAY_SIMULATION_PATHS: int = 10000    # Monte Carlo balance paths per runway simulation
+    RUNWAY_SIMULATION_DAYS: int = 180       # Simulation horizon
+    FORECAST_NIGHTLY_HOUR: int = 2          # UTC hour of the nightly snapshot refresh
+    FORECAST_NIGHTLY_CHUNK_SIZE: int = 50   # Tenants per nightly refit task
+
+    # 🟢 LEARNED CATEGORY WRITE-BEHIND
+    LEARNING_BUFFER_BATCH_SIZE: int = 100       # Flush once this many new categories are pending
+    LEARNING_BUFFER_FLUSH_SECONDS: float = 5.0  # ...or after this long, whichever comes first
+    LEARNING_BUFFER_MAX_PENDING: int = 10000    # Oldest entries are dropped beyond this (store down)
+
+    # 🟢 UPLOADS
+    UPLOAD_MAX_BYTES: int = 50 * 1024 * 1024    # Per-file size cap
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024       # Read/write size while spooling to disk
+    UPLOAD_SPOOL_DIR: Optional[str] = None      # Temp dir for spooled uploads (None = system default)
+    INGEST_FILE_CONCURRENCY: int = 4            # Files of one upload processed at the same time
+
+    # 🟢 RE-UPLOAD CACHE (results of identical files are reused per user)
+    UPLOAD_CACHE_TTL_DAYS: int = 30             # Older audits are never reused
+    UPLOAD_CACHE_MAX_PER_USER: int = 500        # Newest N hashed audits kept reusable per user
 
     class Config:
         case_sensitive = True
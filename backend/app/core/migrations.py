@@ -0,0 +1,125 @@
+from typing import Callable, List, Tuple
+from sqlalchemy import bindparam, inspect, text
+from sqlalchemy.engine import Engine
+
+# 🟢 SCHEMA UPGRADES
+# Base.metadata.create_all only creates missing tables; it never alters a table
+# that already exists. Columns and indexes added to existing tables are listed
+# here and applied on startup, right after create_all. Every step checks the
+# live schema first, so running it again (or from several processes) is a no-op.
+
+# (table, column, SQL type)
+ADDED_COLUMNS: List[Tuple[str, str, str]] = [
+    ("audit_logs", "content_hash", "VARCHAR(64)"),
+    ("transactions", "audit_id", "INTEGER REFERENCES audit_logs(id)"),
+    ("transactions", "vendor_key", "VARCHAR(128)"),
+    ("transactions", "amount_cents", "BIGINT"),
+]
+
+# (index name, table, columns)
+ADDED_INDEXES: List[Tuple[str, str, Tuple[str, ...]]] = [
+    ("ix_audit_logs_user_hash", "audit_logs", ("user_id", "content_hash")),
+    ("ix_transactions_audit_id", "transactions", ("audit_id",)),
+    ("ix_transactions_duplicate_probe", "transactions", ("user_id", "vendor_key", "amount_cents", "date")),
+]
+
+# (index name, table): indexes that no query needs any more but every insert still pays for
+DROPPED_INDEXES: List[Tuple[str, str]] = [
+    # Covered per-day aggregates before the dashboard and forecasts moved to daily_balances
+    ("ix_transactions_user_date", "transactions"),
+]
+
+
+def backfill_duplicate_keys(engine: Engine, batch_size: int = 1000):
+    """Rows stored before the duplicate probe columns existed get their keys, so history checks see them."""
+    from app.services.duplicate_detector import duplicate_key
+
+    select_missing = text(
+        "SELECT id, vendor, description, amount FROM transactions "
+        "WHERE vendor_key IS NULL AND id > :after ORDER BY id LIMIT :limit"
+    )
+    update_keys = text(
+        "UPDATE transactions SET vendor_key = :vendor_key, amount_cents = :amount_cents WHERE id = :row_id"
+    ).bindparams(bindparam("row_id"))
+
+    filled, after = 0, 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(select_missing, {"after": after, "limit": batch_size}).fetchall()
+            if not rows:
+                break
+            updates = []
+            for row_id, vendor, description, amount in rows:
+                probe_vendor, amount_cents = duplicate_key(vendor, description or "", amount or 0.0)
+                updates.append({"row_id": row_id, "vendor_key": probe_vendor, "amount_cents": amount_cents})
+            conn.execute(update_keys, updates)
+        filled += len(rows)
+        after = rows[-1][0]
+    if filled:
+        print(f"🛠️ Schema upgrade: backfilled duplicate keys of {filled} transactions")
+
+
+def backfill_daily_balances(engine: Engine):
+    """
+    daily_balances is created empty next to an existing transactions table:
+    build it once, or the dashboard and forecasts read no history at all.
+    """
+    from sqlalchemy.orm import Session
+    from app.services.daily_balances import rebuild_daily_balances
+
+    with engine.connect() as conn:
+        built = conn.execute(text("SELECT 1 FROM daily_balances LIMIT 1")).first()
+        needed = conn.execute(text("SELECT 1 FROM transactions WHERE user_id IS NOT NULL LIMIT 1")).first()
+    if built or not needed:
+        return
+    with Session(bind=engine) as db:
+        count = rebuild_daily_balances(db)
+        db.commit()
+    print(f"🛠️ Schema upgrade: built daily balances ({count} user-days)")
+
+
+# Data fixes for rows written before a column or table existed: fn(engine), idempotent
+BACKFILLS: List[Callable[[Engine], None]] = [
+    backfill_duplicate_keys,
+    backfill_daily_balances,
+]
+
+
+def _run_step(engine: Engine, sql: str, label: str):
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(sql))
+        print(f"🛠️ Schema upgrade: {label}")
+    except Exception as e:
+        # Another process starting at the same time may have applied it first
+        print(f"⚠️ Schema upgrade skipped ({label}): {e}")
+
+
+def upgrade_schema(engine: Engine):
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+
+    for table, column, sql_type in ADDED_COLUMNS:
+        if table not in tables:
+            continue
+        if column not in {c["name"] for c in inspector.get_columns(table)}:
+            _run_step(engine, f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}", f"{table}.{column}")
+
+    for name, table, columns in ADDED_INDEXES:
+        if table not in tables:
+            continue
+        if name not in {index["name"] for index in inspector.get_indexes(table)}:
+            _run_step(engine, f"CREATE INDEX {name} ON {table} ({', '.join(columns)})", name)
+
+    for name, table in DROPPED_INDEXES:
+        if table not in tables:
+            continue
+        if name in {index["name"] for index in inspector.get_indexes(table)}:
+            _run_step(engine, f"DROP INDEX {name}", f"drop {name}")
+
+    for backfill in BACKFILLS:
+        try:
+            backfill(engine)
+        except Exception as e:
+            # Finished batches are committed; the rest is picked up on the next start
+            print(f"⚠️ Schema backfill {backfill.__name__} stopped: {e}")
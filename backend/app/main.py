@@ -1,18 +1,35 @@
-from fastapi import FastAPI
+import secrets
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.core.database import engine, Base
+from app.core.migrations import upgrade_schema
+from app.core.metrics import metrics
+from app.services.ingestion import shutdown_pdf_pool
+from app.services.forecast_pool import shutdown_forecast_pool, forecast_cache
+from app.services.category_cache import category_cache
+from app.services.vector_store import vector_store_manager
+from app.services.learning_buffer import learning_buffer
+from app.services.llm_scheduler import llm_scheduler
+from app.agents.normalizer import categorize_inflight
+from app.agents.extractor import extraction_cache
 
 # Import Models
 from app.models.user import User
 from app.models.billing import Subscription
 from app.models.transactions import Transaction
 from app.models.audit import AuditLog 
+from app.models.vendor_stats import VendorStats
+from app.models.anomaly_state import AnomalyState
+from app.models.forecast_snapshot import ForecastSnapshot
+from app.models.daily_balance import DailyBalance
 
 # Import Routers
 from app.api.endpoints import auth, user, billing, transactions, dashboard, ingest
 
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)  # Columns / indexes added to tables that already existed
 
 app = FastAPI(title=settings.PROJECT_NAME)
 
@@ -37,6 +54,30 @@ app.include_router(ingest.router, prefix=f"{settings.API_V1_STR}/ingest", tags=[
 # 🟢 DASHBOARD (Fixed: Moved under API V1 to match Frontend)
 app.include_router(dashboard.router, prefix=f"{settings.API_V1_STR}/dashboard", tags=["Dashboard"])
 
+@app.on_event("shutdown")
+def shutdown_workers():
+    shutdown_pdf_pool()
+    shutdown_forecast_pool()
+    learning_buffer.close()
+
 @app.get("/")
 def health_check():
-    return {"status": "operational", "db": "connected"}
\ No newline at end of file
+    return {"status": "operational", "db": "connected"}
+
+@app.get("/metrics")
+def get_metrics(x_metrics_token: Optional[str] = Header(None)):
+    # Internal counters: only for callers holding METRICS_TOKEN (scrapers, ops)
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_metrics_token or not secrets.compare_digest(x_metrics_token, settings.METRICS_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return {
+        **metrics.snapshot(),
+        "category_cache": category_cache.stats(),
+        "vector_store": vector_store_manager.status(),
+        "learning_buffer": learning_buffer.stats(),
+        "llm_scheduler": llm_scheduler.status(),
+        "categorize_singleflight": categorize_inflight.stats(),
+        "extraction_cache": extraction_cache.stats(),
+        "forecast_cache": forecast_cache.stats()
+    }
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, UniqueConstraint
+from datetime import datetime
+from app.core.database import Base
+
+# 🟢 Streaming anomaly engine state: one small JSON blob per (user, vendor),
+# plus one per user for tenant-wide signals (scope "tenant").
+class AnomalyState(Base):
+    __tablename__ = "anomaly_states"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    scope = Column(String, nullable=False)  # "tenant" or "vendor:<vendor>"
+    state = Column(JSON, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "scope", name="uq_anomaly_states_user_scope"),
+    )
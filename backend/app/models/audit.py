@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.core.database import Base
@@ -14,5 +14,11 @@ class AuditLog(Base):
     findings = Column(JSON, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
+    # 🟢 SHA-256 of the uploaded file, used to reuse results on re-upload
+    content_hash = Column(String(64), nullable=True)
 
-    user = relationship("app.models.user.User", back_populates="audit_logs")
\ No newline at end of file
+    user = relationship("app.models.user.User", back_populates="audit_logs")
+
+    __table_args__ = (
+        Index("ix_audit_logs_user_hash", "user_id", "content_hash"),
+    )
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, Float, Date, ForeignKey, UniqueConstraint
+from app.core.database import Base
+
+# 🟢 Per-user, per-day rollup of transactions, kept in step with the
+# transactions table (see app/services/daily_balances.py). A running balance is
+# the cumulative sum of net_change over a date-ordered range scan.
+class DailyBalance(Base):
+    __tablename__ = "daily_balances"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    date = Column(Date, nullable=False)
+    net_change = Column(Float, nullable=False, default=0.0)      # SUM(amount)
+    positive_total = Column(Float, nullable=False, default=0.0)  # SUM(amount) over amount > 0
+    txn_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "date", name="uq_daily_balances_user_date"),  # Also the range-scan index
+    )
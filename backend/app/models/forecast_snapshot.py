@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON
+from datetime import datetime
+from app.core.database import Base
+
+# 🟢 Precomputed runway forecast per user, refreshed by the nightly Celery job.
+# (txn_count, max_txn_id) is the watermark of the transactions it was fitted on:
+# a tenant is refit only when its current watermark differs.
+class ForecastSnapshot(Base):
+    __tablename__ = "forecast_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), unique=True, nullable=False)
+    txn_count = Column(Integer, nullable=False, default=0)
+    max_txn_id = Column(Integer, nullable=False, default=0)
+    engine = Column(String)  # Forecast engine that produced it ("fast" / "prophet")
+    result = Column(JSON, nullable=False)  # Same metrics/chart_data as POST /forecast
+    computed_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
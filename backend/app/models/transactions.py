@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Date, Boolean, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.core.database import Base
@@ -9,6 +9,7 @@ class Transaction(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id")) 
+    audit_id = Column(Integer, ForeignKey("audit_logs.id"), index=True, nullable=True)  # Upload it came from
     date = Column(Date, nullable=False)
     description = Column(String, index=True)
     vendor = Column(String, index=True)
@@ -20,6 +21,14 @@ class Transaction(Base):
     risk_score = Column(Float, default=0.0)
     audit_note = Column(String)
 
+    # 🟢 Duplicate detection probe: canonical vendor + amount in cents (+ date range)
+    vendor_key = Column(String(128), nullable=True)
+    amount_cents = Column(BigInteger, nullable=True)
+
     # Relationship to User
     user = relationship("app.models.user.User", back_populates="transactions")
 
+    __table_args__ = (
+        Index("ix_transactions_duplicate_probe", "user_id", "vendor_key", "amount_cents", "date"),
+    )
+
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, UniqueConstraint
+from datetime import datetime
+from app.core.database import Base
+
+# 🟢 Running spend statistics per (user, vendor), maintained incrementally
+# (Welford / Chan) as analyzed transactions are stored. The auditor reads its
+# baselines from here instead of scanning the transaction history.
+class VendorStats(Base):
+    __tablename__ = "vendor_stats"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    vendor = Column(String, nullable=False)
+
+    count = Column(Integer, nullable=False, default=0)
+    mean = Column(Float, nullable=False, default=0.0)
+    m2 = Column(Float, nullable=False, default=0.0)  # Sum of squared deviations from the mean
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "vendor", name="uq_vendor_stats_user_vendor"),
+    )
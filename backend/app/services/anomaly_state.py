@@ -0,0 +1,77 @@
+from typing import Iterable
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.agents.anomaly_engine import StreamingAnomalyScorer
+from app.models.anomaly_state import AnomalyState
+
+# 🟢 STREAMING ENGINE STATE STORE
+# Only the states of the vendors in the statement (and the tenant's) are read
+# and written, so the cost doesn't grow with the tenant's history.
+# Saving re-reads those rows under a row lock and replays the statement's
+# observations onto them, so two uploads of one user don't lose each other's updates.
+
+TENANT_SCOPE = "tenant"
+VENDOR_PREFIX = "vendor:"
+
+
+def load_scorer(db: Session, user_id: int, vendors: Iterable[str]) -> StreamingAnomalyScorer:
+    scopes = [TENANT_SCOPE] + [VENDOR_PREFIX + vendor for vendor in set(vendors)]
+    rows = []
+    for i in range(0, len(scopes), 500):
+        rows += db.query(AnomalyState.scope, AnomalyState.state).filter(
+            AnomalyState.user_id == user_id,
+            AnomalyState.scope.in_(scopes[i : i + 500])
+        ).all()
+
+    tenant_state = None
+    vendor_states = {}
+    for scope, state in rows:
+        if scope == TENANT_SCOPE:
+            tenant_state = state
+        else:
+            vendor_states[scope[len(VENDOR_PREFIX):]] = state
+    return StreamingAnomalyScorer.from_states(vendor_states, tenant_state)
+
+
+def _write_states(db: Session, user_id: int, scorer: StreamingAnomalyScorer):
+    scopes = [TENANT_SCOPE] + [VENDOR_PREFIX + vendor for vendor in scorer.touched]
+    existing = {}
+    for i in range(0, len(scopes), 500):
+        for row in db.query(AnomalyState).filter(
+            AnomalyState.user_id == user_id,
+            AnomalyState.scope.in_(scopes[i : i + 500])
+        ).with_for_update():
+            existing[row.scope] = row
+
+    # The rows may have moved on since load_scorer (another upload of this user
+    # saved in between): fold this statement into their current values instead
+    # of overwriting them.
+    tenant_row = existing.get(TENANT_SCOPE)
+    current_vendors = {
+        scope[len(VENDOR_PREFIX):]: row.state for scope, row in existing.items() if scope != TENANT_SCOPE
+    }
+    merged = scorer.replay_onto(current_vendors, tenant_row.state if tenant_row else None)
+
+    vendor_states, tenant_state = merged.export()
+    states = {VENDOR_PREFIX + vendor: state for vendor, state in vendor_states.items()}
+    states[TENANT_SCOPE] = tenant_state
+    for scope, state in states.items():
+        row = existing.get(scope)
+        if row is None:
+            db.add(AnomalyState(user_id=user_id, scope=scope, state=state))
+        else:
+            row.state = state
+
+
+def save_scorer(db: Session, user_id: int, scorer: StreamingAnomalyScorer):
+    """Writes back the states the scorer touched, merged with concurrent saves. Caller commits."""
+    if not scorer.observed:
+        return
+    try:
+        with db.begin_nested():
+            _write_states(db, user_id, scorer)
+    except IntegrityError:
+        # Another upload of this user created one of the rows first: read it back and merge
+        _write_states(db, user_id, scorer)
+    scorer.touched.clear()
+    scorer.observed.clear()
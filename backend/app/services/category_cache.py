@@ -0,0 +1,90 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from app.core.config import settings
+from app.core.metrics import metrics
+
+# 🟢 IN-PROCESS CATEGORY CACHE
+# Sits in front of the vector store so merchants we've already seen today
+# ("NETFLIX.COM 1234", "NETFLIX.COM 9876") are answered without Pinecone/OpenAI.
+
+_DATES = re.compile(r"\b\d{1,4}[/.-]\d{1,2}[/.-]\d{1,4}\b")
+_TIMES = re.compile(r"\b\d{1,2}:\d{2}(:\d{2})?\b")
+_CARD_SUFFIX = re.compile(r"(\*+|X{2,}|CARD\s+(ENDING|NO\.?)\s*)\s*\d{2,}", re.IGNORECASE)
+_REFERENCE = re.compile(r"\b(REF|REFERENCE|TRN|TXN|ID|NO)\b\.?\s*[:#-]?\s*[A-Z0-9-]*\d[A-Z0-9-]*", re.IGNORECASE)
+_MIXED_TOKEN = re.compile(r"\b(?=[A-Z]*\d)(?=\d*[A-Z])[A-Z0-9]{6,}\b")
+_DIGITS = re.compile(r"\d+")
+_PUNCTUATION = re.compile(r"[^\w\s]|_")
+_SPACES = re.compile(r"\s+")
+
+
+def canonicalize_description(description: str) -> str:
+    """
+    Reduces a bank description to its merchant part, so every occurrence of the
+    same merchant shares one cache key. Dates, times, card suffixes, reference
+    numbers and bare digit runs are removed.
+    """
+    text = description.upper()
+    text = _CARD_SUFFIX.sub(" ", text)
+    text = _REFERENCE.sub(" ", text)
+    text = _DATES.sub(" ", text)
+    text = _TIMES.sub(" ", text)
+    text = _MIXED_TOKEN.sub(" ", text)
+    text = _DIGITS.sub(" ", text)
+    text = _PUNCTUATION.sub(" ", text)
+    canonical = _SPACES.sub(" ", text).strip()
+    # Purely numeric descriptions would all collapse to "": keep them distinct
+    return canonical or description.strip().upper()
+
+
+class CategoryCache:
+    """Bounded LRU with a TTL per entry. Safe to share across requests and threads."""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.incr("category_cache.hits")
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            metrics.incr("category_cache.misses")
+            return None
+
+    def set(self, key: str, value: dict):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+category_cache = CategoryCache(settings.CATEGORY_CACHE_SIZE, settings.CATEGORY_CACHE_TTL_SECONDS)
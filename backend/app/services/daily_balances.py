@@ -0,0 +1,272 @@
+import argparse
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import pandas as pd
+from sqlalchemy import case, event, func, insert, inspect, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import BindParameter
+from app.models.transactions import Transaction
+from app.models.daily_balance import DailyBalance
+from app.models.forecast_snapshot import ForecastSnapshot
+
+# 🟢 DAILY BALANCE ROLLUP
+# daily_balances holds SUM(amount), SUM(positive amount) and COUNT(*) per
+# (user, day). It's kept in step with transactions in the same DB transaction:
+# - ORM inserts / edits / deletes: a before_flush listener turns them into deltas
+# - ORM bulk UPDATE / DELETE statements: the affected users are rebuilt
+# - bulk_insert_mappings bypasses both, so callers pass the rows to record_inserted()
+# `python -m app.services.daily_balances` rebuilds everything from transactions;
+# on startup, an empty rollup next to existing transactions is built once
+# (see app.core.migrations). A rebuild, or an edit to an existing row's amount,
+# date or owner, drops the users' forecast snapshots: the snapshot watermark
+# (row count, max id) can't see those changes.
+
+DayKey = Tuple[int, date]
+Deltas = Dict[DayKey, List[float]]  # [net_change, positive_total, txn_count]
+
+
+def _as_date(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _add(deltas: Deltas, user_id, day, amount, sign: int):
+    if user_id is None or day is None or amount is None:
+        return
+    delta = deltas[(user_id, _as_date(day))]
+    delta[0] += sign * amount
+    delta[1] += sign * max(amount, 0.0)
+    delta[2] += sign
+
+
+def apply_deltas(db: Session, deltas: Deltas):
+    """Folds per-day deltas into the rollup; days left with no transactions are removed. Caller commits."""
+    by_user: Dict[int, List[date]] = defaultdict(list)
+    for user_id, day in deltas:
+        by_user[user_id].append(day)
+
+    for user_id, days in by_user.items():
+        existing = {}
+        # Chunked IN (...) keeps us under SQLite's bound-parameter limit
+        for i in range(0, len(days), 500):
+            for row in db.query(DailyBalance).filter(
+                DailyBalance.user_id == user_id,
+                DailyBalance.date.in_(days[i : i + 500])
+            ).with_for_update():
+                existing[row.date] = row
+
+        for day in days:
+            net, positive, count = deltas[(user_id, day)]
+            if count == 0 and net == 0:
+                continue
+            row = existing.get(day)
+            if row is None:
+                if count <= 0:
+                    continue
+                row = DailyBalance(user_id=user_id, date=day, net_change=0.0, positive_total=0.0, txn_count=0)
+                db.add(row)
+            if row.txn_count + count <= 0:
+                db.delete(row)
+                continue
+            row.net_change += net
+            row.positive_total += positive
+            row.txn_count += int(count)
+
+
+def record_inserted(db: Session, rows: Iterable[dict]):
+    """Rollup update for rows written with bulk_insert_mappings (no ORM events fire for those)."""
+    deltas: Deltas = defaultdict(lambda: [0.0, 0.0, 0])
+    for row in rows:
+        _add(deltas, row.get("user_id"), row.get("date"), row.get("amount"), 1)
+    if not deltas:
+        return
+    try:
+        with db.begin_nested():
+            apply_deltas(db, deltas)
+    except IntegrityError:
+        # Another upload of this user created one of the days first: read it back and add to it
+        apply_deltas(db, deltas)
+
+
+def rebuild_daily_balances(db: Session, user_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recomputes the rollup from transactions (all users, or only `user_ids`) and
+    drops their forecast snapshots, which were fitted on the old totals, so the
+    nightly job refits them. Caller commits.
+    """
+    ids = None if user_ids is None else list(user_ids)
+    cleared = db.query(DailyBalance)
+    snapshots = db.query(ForecastSnapshot)
+    totals = select(
+        Transaction.user_id,
+        Transaction.date,
+        func.sum(Transaction.amount),
+        func.sum(case((Transaction.amount > 0, Transaction.amount), else_=0.0)),
+        func.count(Transaction.id),
+    ).where(Transaction.user_id.isnot(None)).group_by(Transaction.user_id, Transaction.date)
+    if ids is not None:
+        if not ids:
+            return 0
+        cleared = cleared.filter(DailyBalance.user_id.in_(ids))
+        snapshots = snapshots.filter(ForecastSnapshot.user_id.in_(ids))
+        totals = totals.where(Transaction.user_id.in_(ids))
+
+    cleared.delete(synchronize_session=False)
+    snapshots.delete(synchronize_session=False)
+    result = db.execute(insert(DailyBalance).from_select(
+        ["user_id", "date", "net_change", "positive_total", "txn_count"], totals
+    ))
+    return result.rowcount
+
+
+def load_daily_balances(db: Session, user_id: int, start=None) -> pd.DataFrame:
+    """
+    One indexed range scan: columns date, net_change, positive_total and
+    balance (running total from the user's first transaction).
+    """
+    opening = 0.0
+    if start is not None:
+        opening = db.query(func.coalesce(func.sum(DailyBalance.net_change), 0.0)).filter(
+            DailyBalance.user_id == user_id,
+            DailyBalance.date < start
+        ).scalar()
+
+    query = db.query(DailyBalance.date, DailyBalance.net_change, DailyBalance.positive_total).filter(
+        DailyBalance.user_id == user_id
+    )
+    if start is not None:
+        query = query.filter(DailyBalance.date >= start)
+    daily = pd.DataFrame(query.order_by(DailyBalance.date).all(), columns=["date", "net_change", "positive_total"])
+    daily["balance"] = opening + daily["net_change"].cumsum()
+    return daily
+
+
+# 🟢 ORM EVENT HOOKS
+
+def _on_before_flush(session: Session, flush_context, instances):
+    deltas: Deltas = defaultdict(lambda: [0.0, 0.0, 0])
+    for obj in session.new:
+        if isinstance(obj, Transaction):
+            _add(deltas, obj.user_id, obj.date, obj.amount, 1)
+    for obj in session.deleted:
+        if isinstance(obj, Transaction):
+            _add(deltas, obj.user_id, obj.date, obj.amount, -1)
+    edited: Set[int] = set()
+    for obj in session.dirty:
+        if not isinstance(obj, Transaction):
+            continue
+        attrs = inspect(obj).attrs
+        before, changed = {}, False
+        for name in ("user_id", "date", "amount"):
+            history = attrs[name].history
+            if history.deleted or history.added:
+                changed = True
+                before[name] = history.deleted[0] if history.deleted else None
+            else:
+                before[name] = getattr(obj, name)
+        if changed:
+            _add(deltas, before["user_id"], before["date"], before["amount"], -1)
+            _add(deltas, obj.user_id, obj.date, obj.amount, 1)
+            edited.update(uid for uid in (before["user_id"], obj.user_id) if uid is not None)
+    if deltas:
+        apply_deltas(session, deltas)
+    if edited:
+        session.query(ForecastSnapshot).filter(
+            ForecastSnapshot.user_id.in_(edited)
+        ).delete(synchronize_session=False)
+
+
+def _on_orm_execute(state):
+    if not (state.is_update or state.is_delete or state.is_insert):
+        return None
+    mapper = state.bind_mapper
+    if mapper is None or mapper.class_ is not Transaction:
+        return None
+
+    if state.is_insert:
+        # insert(Transaction) with a list of rows: same as bulk_insert_mappings
+        params = state.parameters
+        rows = params if isinstance(params, list) else [params] if params else []
+        result = state.invoke_statement()
+        record_inserted(state.session, rows)
+        return result
+
+    # Bulk UPDATE / DELETE: rebuild the users whose rows the statement touches,
+    # both where they were and where an UPDATE moves them
+    user_ids = _matched_user_ids(state)
+    moved_to = _assigned_user_ids(state) if state.is_update else set()
+    result = state.invoke_statement()
+    if moved_to is None:
+        # SET user_id = <SQL expression>: the new owners aren't known up front
+        rebuild_daily_balances(state.session)
+    else:
+        rebuild_daily_balances(state.session, user_ids | moved_to)
+    return result
+
+
+def _matched_user_ids(state) -> Set[int]:
+    """Owners of the rows a bulk UPDATE / DELETE will touch, read before it runs."""
+    params = state.parameters
+    if isinstance(params, list) and params and all("id" in row for row in params):
+        # update(Transaction) with a list of rows: bulk update by primary key
+        ids = [row["id"] for row in params]
+        user_ids = set()
+        for i in range(0, len(ids), 500):
+            user_ids.update(state.session.execute(
+                select(Transaction.user_id).where(Transaction.id.in_(ids[i : i + 500])).distinct()
+            ).scalars())
+        return {user_id for user_id in user_ids if user_id is not None}
+
+    affected = select(Transaction.user_id).distinct()
+    if state.statement.whereclause is not None:
+        affected = affected.where(state.statement.whereclause)
+    return {user_id for (user_id,) in state.session.execute(affected) if user_id is not None}
+
+
+def _assigned_user_ids(state) -> Optional[Set[int]]:
+    """
+    user_id values an UPDATE writes, from its SET clause (or its per-row
+    parameters). None when one of them is a SQL expression.
+    """
+    assigned = set()
+    params = state.parameters
+    rows = params if isinstance(params, list) else [params] if params else []
+    for row in rows:
+        if row.get("user_id") is not None:
+            assigned.add(row["user_id"])
+
+    for key, value in (state.statement._values or {}).items():
+        if (key if isinstance(key, str) else getattr(key, "key", None)) != "user_id":
+            continue
+        if not isinstance(value, BindParameter):
+            return None
+        if value.value is not None:
+            assigned.add(value.value)
+    return assigned
+
+
+# Old values of these must be known at flush time to move a transaction between days
+for _attribute in (Transaction.user_id, Transaction.date, Transaction.amount):
+    event.listen(_attribute, "set", lambda *args: None, active_history=True)
+
+event.listen(Session, "before_flush", _on_before_flush)
+event.listen(Session, "do_orm_execute", _on_orm_execute)
+
+
+if __name__ == "__main__":
+    from app.core.database import SessionLocal
+    # The mappers reference each other by name: load them all, as main.py does
+    from app.models import user, billing, audit  # noqa: F401
+
+    parser = argparse.ArgumentParser(description="Rebuild the daily_balances rollup from transactions.")
+    parser.add_argument("user_ids", nargs="*", type=int, help="Only these users (default: everyone)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        count = rebuild_daily_balances(db, args.user_ids or None)
+        db.commit()
+        print(f"✅ Rebuilt daily balances: {count} user-days")
+    finally:
+        db.close()
@@ -0,0 +1,128 @@
+import re
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.transactions import Transaction
+from app.services.category_cache import canonicalize_description
+
+# 🟢 DUPLICATE / DOUBLE-CHARGE DETECTION
+# A transaction is a possible duplicate when another one with the same canonical
+# vendor, the same account / invoice numbers and the same amount (to the cent)
+# falls within DUPLICATE_WINDOW_DAYS.
+# Stored rows are found with range probes on ix_transactions_duplicate_probe
+# (user_id, vendor_key, amount_cents, date), never by comparing rows pairwise.
+
+DupKey = Tuple[str, int]
+
+# Numbers that differ between two postings of the same charge; everything else
+# (account, invoice, card numbers) tells two payments to one payee apart
+_POSTING_NUMBERS = re.compile(
+    r"\b\d{1,4}[/.-]\d{1,2}[/.-]\d{1,4}\b"                       # dates
+    r"|\b\d{1,2}:\d{2}(?::\d{2})?\b"                              # times
+    r"|\b(?:REF|REFERENCE|TRN|TXN|ID)\b\.?\s*[:#-]?\s*[A-Z0-9-]*\d[A-Z0-9-]*",  # posting references
+    re.IGNORECASE
+)
+_NUMBER = re.compile(r"\d+")
+
+
+class DuplicateFinding(NamedTuple):
+    note: str
+    risk: float
+
+
+def duplicate_key(vendor: Optional[str], description: str, amount: float) -> DupKey:
+    """(canonical vendor + identifying numbers, amount in cents). Also stored on each Transaction row."""
+    vendor_key = canonicalize_description(vendor or description or "")
+    numbers = _NUMBER.findall(_POSTING_NUMBERS.sub(" ", description or ""))
+    if numbers:
+        vendor_key = f"{vendor_key} #{' '.join(numbers)}"
+    return vendor_key[:128], int(round(abs(amount) * 100))
+
+
+def _as_date(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def find_duplicates(db: Session, user_id: int, transactions, window_days: int = None) -> List[Optional[DuplicateFinding]]:
+    """
+    Returns one finding per transaction: None, or why it looks like a duplicate.
+    Checks the statement itself first, then the user's stored history. History
+    matches get the lower DUPLICATE_HISTORY_RISK_SCORE: an overlapping or
+    re-uploaded statement repeats rows without anything being charged twice.
+    """
+    window = timedelta(days=settings.DUPLICATE_WINDOW_DAYS if window_days is None else window_days)
+    notes: List[Optional[DuplicateFinding]] = [None] * len(transactions)
+    by_key: Dict[DupKey, List[Tuple[date, int]]] = defaultdict(list)
+
+    for i, txn in enumerate(transactions):
+        by_key[duplicate_key(txn.vendor, txn.description, txn.amount)].append((_as_date(txn.date), i))
+
+    # 1. Inside this statement: neighbours in date order per key
+    for rows in by_key.values():
+        if len(rows) < 2:
+            continue
+        rows.sort()
+        for (prev_day, _), (day, i) in zip(rows, rows[1:]):
+            if day - prev_day <= window:
+                notes[i] = DuplicateFinding(
+                    f"Possible duplicate: same vendor and amount on {prev_day.isoformat()} in this statement",
+                    settings.DUPLICATE_RISK_SCORE
+                )
+
+    # 2. Against stored history: one indexed range probe per batch of keys
+    if user_id is not None and by_key:
+        stored = _probe_history(db, user_id, by_key, window)
+        for key, rows in by_key.items():
+            history = stored.get(key)
+            if not history:
+                continue
+            for day, i in rows:
+                match = next((h for h in history if abs(h[0] - day) <= window), None)
+                if match and notes[i] is None:
+                    source = f" (audit #{match[1]})" if match[1] else ""
+                    notes[i] = DuplicateFinding(
+                        f"Possible duplicate of a {match[0].isoformat()} transaction{source}",
+                        settings.DUPLICATE_HISTORY_RISK_SCORE
+                    )
+    return notes
+
+
+def _probe_history(db: Session, user_id: int, by_key: Dict[DupKey, list], window: timedelta) -> Dict[DupKey, list]:
+    days = [day for rows in by_key.values() for day, _ in rows]
+    start, end = min(days) - window, max(days) + window
+
+    found: Dict[DupKey, list] = defaultdict(list)
+    keys = list(by_key)
+    for i in range(0, len(keys), 200):
+        batch = keys[i : i + 200]
+        vendors = {vendor for vendor, _ in batch}
+        cents = {amount for _, amount in batch}
+        wanted = set(batch)
+        rows = db.query(
+            Transaction.vendor_key, Transaction.amount_cents, Transaction.date, Transaction.audit_id
+        ).filter(
+            Transaction.user_id == user_id,
+            Transaction.vendor_key.in_(vendors),
+            Transaction.amount_cents.in_(cents),
+            Transaction.date.between(start, end)
+        ).all()
+        for vendor, amount, day, audit_id in rows:
+            if (vendor, amount) in wanted:
+                found[(vendor, amount)].append((day, audit_id))
+    return found
+
+
+def flag_duplicate(audit_result: dict, finding: Optional[DuplicateFinding]) -> dict:
+    """Adds a duplicate finding to an audit verdict; it only raises an ALERT at ANOMALY_ALERT_SCORE or above."""
+    if not finding:
+        return audit_result
+    alert = audit_result.get("status") == "ALERT"
+    notes = [audit_result["note"]] if alert else []
+    return {
+        **audit_result,
+        "status": "ALERT" if alert or finding.risk >= settings.ANOMALY_ALERT_SCORE else audit_result.get("status", "OK"),
+        "risk_score": max(audit_result.get("risk_score", 0.0), finding.risk),
+        "note": " | ".join(notes + [finding.note]),
+    }
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+from app.core.metrics import metrics
+
+# 🟢 PERSISTENT EXTRACTION CACHE
+# Parsed LLM extraction results, keyed by (prompt version, model, chunk text).
+# A retried upload or a re-audit of a known document re-uses the answers of the
+# first run instead of spending LLM quota on the same chunks again.
+# Lives in its own SQLite file so it survives restarts and is shared by the API
+# and the Celery worker on the same host.
+
+
+def chunk_key(prompt_version: str, model: str, chunk_text: str) -> str:
+    digest = hashlib.sha256()
+    for part in (prompt_version, model, chunk_text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Size-bounded (least recently used first) key/value store of JSON arrays.
+    Entries written under another prompt version are dropped when the cache is
+    opened, once unused for `version_grace_seconds`: processes still running the
+    old prompt during a rolling deploy keep their entries until they stop.
+    Blocking; run it in a threadpool from async code.
+    """
+
+    def __init__(self, path: str, max_entries: int, prompt_version: str, version_grace_seconds: float = 0):
+        self.path = path
+        self.max_entries = max_entries
+        self.prompt_version = prompt_version
+        self.version_grace_seconds = version_grace_seconds
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._count = 0  # Running estimate; other processes' inserts are picked up when it hits the limit
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS extraction_cache ("
+                " key TEXT PRIMARY KEY, prompt_version TEXT NOT NULL,"
+                " result TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_extraction_cache_last_used ON extraction_cache (last_used)")
+            stale = conn.execute(
+                "DELETE FROM extraction_cache WHERE prompt_version != ? AND last_used < ?",
+                (self.prompt_version, time.time() - self.version_grace_seconds)
+            ).rowcount
+            conn.commit()
+            if stale:
+                print(f"🧹 Extraction cache: dropped {stale} entries from other prompt versions")
+            (self._count,) = conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[list]:
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT result FROM extraction_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                metrics.incr("extraction_cache.misses")
+                return None
+            conn.execute("UPDATE extraction_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+        metrics.incr("extraction_cache.hits")
+        return json.loads(row[0])
+
+    def set(self, key: str, result: list):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            updated = conn.execute(
+                "UPDATE extraction_cache SET prompt_version = ?, result = ?, created_at = ?, last_used = ? "
+                "WHERE key = ?",
+                (self.prompt_version, json.dumps(result), now, now, key)
+            ).rowcount
+            if not updated:
+                conn.execute(
+                    "INSERT OR REPLACE INTO extraction_cache (key, prompt_version, result, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, self.prompt_version, json.dumps(result), now, now)
+                )
+                self._count += 1
+            if self._count > self.max_entries:
+                # Only now pay for an exact count (includes other processes' inserts)
+                (self._count,) = conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()
+            if self._count > self.max_entries:
+                # Evict down to 90% so we don't pay a delete on every insert
+                excess = self._count - int(self.max_entries * 0.9)
+                conn.execute(
+                    "DELETE FROM extraction_cache WHERE key IN "
+                    "(SELECT key FROM extraction_cache ORDER BY last_used LIMIT ?)", (excess,)
+                )
+                self._count -= excess
+                metrics.incr("extraction_cache.evictions", excess)
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM extraction_cache")
+            conn.commit()
+            self._count = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            (count,) = self._connection().execute("SELECT COUNT(*) FROM extraction_cache").fetchone()
+        return {"entries": count, "max_entries": self.max_entries, "prompt_version": self.prompt_version}
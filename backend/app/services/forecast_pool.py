@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.agents.forecast_engines import ENGINES, select_engine
+
+# 🟢 OFF-LOOP FORECASTING
+# Model fits run in a dedicated process pool so a Stan fit never blocks the
+# event loop. Identical requests (same series, same horizon) are answered from
+# an in-process result cache, and Prophet fits warm-start from the model saved
+# for the same series the last time it was fitted. Saved models unused for
+# FORECAST_MODEL_TTL_DAYS, or beyond FORECAST_MODEL_MAX_FILES, are deleted.
+_pool: Optional[ProcessPoolExecutor] = None
+_pending = 0  # Jobs submitted and not finished (bounded by FORECAST_QUEUE_SIZE)
+_last_model_sweep = 0.0
+MODEL_SWEEP_INTERVAL_SECONDS = 60 * 60
+
+
+def get_forecast_pool() -> ProcessPoolExecutor:
+    """Returns the shared forecasting pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.FORECAST_WORKERS)
+    return _pool
+
+
+def shutdown_forecast_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+class ForecastCache:
+    """Bounded LRU of forecast frames with a TTL per entry."""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                metrics.incr("forecast_cache.misses")
+                return None
+            self._entries.move_to_end(key)
+        metrics.incr("forecast_cache.hits")
+        return entry[1].copy()
+
+    def set(self, key: str, forecast: pd.DataFrame):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, forecast.copy())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries)}
+
+
+forecast_cache = ForecastCache(settings.FORECAST_CACHE_SIZE, settings.FORECAST_CACHE_TTL_SECONDS)
+
+
+def _series_arrays(df: pd.DataFrame):
+    ds = pd.to_datetime(df["ds"]).to_numpy(dtype="datetime64[D]")
+    y = df["y"].to_numpy(dtype=float)
+    return ds, y
+
+
+def result_key(df: pd.DataFrame, periods: int, engine_name: str, weekly: bool, monthly: bool) -> str:
+    """Hash of the whole input series, the horizon and the engine configuration."""
+    ds, y = _series_arrays(df)
+    digest = hashlib.sha256(f"{engine_name}|{weekly}|{monthly}|{periods}|".encode())
+    digest.update(ds.astype("int64").tobytes())
+    digest.update(np.round(y, 6).tobytes())
+    return digest.hexdigest()
+
+
+def model_key(df: pd.DataFrame, engine_name: str, weekly: bool, monthly: bool) -> str:
+    """
+    Identity of a series as it grows day by day: its first
+    FORECAST_MODEL_PREFIX_DAYS points and how it's modelled. Tomorrow's request
+    for the same account maps to today's model; two accounts only share one if
+    their whole opening stretch is identical.
+    """
+    ds, y = _series_arrays(df)
+    prefix = settings.FORECAST_MODEL_PREFIX_DAYS
+    digest = hashlib.sha256(f"{engine_name}|{weekly}|{monthly}|{min(len(ds), prefix)}|".encode())
+    digest.update(ds[:prefix].astype("int64").tobytes())
+    digest.update(np.round(y[:prefix], 6).tobytes())
+    return digest.hexdigest()
+
+
+def evict_saved_models(directory: str = None) -> int:
+    """
+    Deletes warm-start models unused for FORECAST_MODEL_TTL_DAYS, then the least
+    recently used beyond FORECAST_MODEL_MAX_FILES (a fit rewrites its file, so
+    mtime is the last use). Returns how many files were removed.
+    """
+    directory = directory or settings.FORECAST_MODEL_DIR
+    try:
+        entries = [entry for entry in os.scandir(directory) if entry.is_file() and entry.name.endswith(".json")]
+    except FileNotFoundError:
+        return 0
+    expires = time.time() - settings.FORECAST_MODEL_TTL_DAYS * 86400
+    files = sorted(((entry.stat().st_mtime, entry.path) for entry in entries), reverse=True)
+    doomed = [path for i, (mtime, path) in enumerate(files) if mtime < expires or i >= settings.FORECAST_MODEL_MAX_FILES]
+    removed = 0
+    for path in doomed:
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass  # Another process swept it first
+    if removed:
+        metrics.incr("forecast.models_evicted", removed)
+    return removed
+
+
+def _run_forecast(engine_name: str, weekly: bool, monthly: bool, ds, y, periods: int, model_path: Optional[str]):
+    """Worker-side: fit + predict. Only plain arrays cross the process boundary."""
+    engine = ENGINES[engine_name](weekly_seasonality=weekly, monthly_seasonality=monthly)
+    df = pd.DataFrame({"ds": pd.to_datetime(ds), "y": y})
+    if engine_name == "prophet":
+        forecast = engine.forecast(df, periods, model_path=model_path)
+    else:
+        forecast = engine.forecast(df, periods)
+    return forecast["ds"].to_numpy(dtype="datetime64[D]"), forecast["yhat"].to_numpy(dtype=float)
+
+
+async def forecast_series(df: pd.DataFrame, periods: int, weekly: bool = False, monthly: bool = False) -> pd.DataFrame:
+    """
+    Async front door for forecasting: cache lookup, then a fit in the process
+    pool. Raises HTTP 503 when FORECAST_QUEUE_SIZE jobs are already waiting.
+    """
+    global _pending
+    engine = select_engine(len(df), weekly_seasonality=weekly, monthly_seasonality=monthly)
+    key = result_key(df, periods, engine.name, weekly, monthly)
+    cached = forecast_cache.get(key)
+    if cached is not None:
+        return cached
+
+    if _pending >= settings.FORECAST_QUEUE_SIZE:
+        metrics.incr("forecast.rejected")
+        raise HTTPException(status_code=503, detail="Forecasting is busy. Please retry in a moment.")
+
+    model_path = None
+    if engine.name == "prophet":
+        os.makedirs(settings.FORECAST_MODEL_DIR, exist_ok=True)
+        model_path = os.path.join(settings.FORECAST_MODEL_DIR, f"{model_key(df, engine.name, weekly, monthly)}.json")
+
+    ds, y = _series_arrays(df)
+    _pending += 1
+    metrics.set("forecast.pending", _pending)
+    started = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        try:
+            out_ds, yhat = await loop.run_in_executor(
+                get_forecast_pool(), _run_forecast, engine.name, weekly, monthly, ds, y, periods, model_path
+            )
+        except BrokenProcessPool:
+            # A worker died (OOM in Stan, killed): start a fresh pool and retry once
+            shutdown_forecast_pool()
+            out_ds, yhat = await loop.run_in_executor(
+                get_forecast_pool(), _run_forecast, engine.name, weekly, monthly, ds, y, periods, model_path
+            )
+    finally:
+        _pending -= 1
+        metrics.set("forecast.pending", _pending)
+
+    metrics.observe(f"forecast.{engine.name}_seconds", time.perf_counter() - started)
+    forecast = pd.DataFrame({"ds": pd.to_datetime(out_ds), "yhat": yhat})
+    forecast_cache.set(key, forecast)
+
+    global _last_model_sweep
+    if model_path and time.monotonic() - _last_model_sweep > MODEL_SWEEP_INTERVAL_SECONDS:
+        _last_model_sweep = time.monotonic()
+        await loop.run_in_executor(None, evict_saved_models)
+    return forecast
@@ -0,0 +1,97 @@
+from typing import Dict, Iterable, List, Tuple
+import pandas as pd
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from app.models.transactions import Transaction
+from app.models.forecast_snapshot import ForecastSnapshot
+from app.agents.forecast_engines import select_engine
+from app.agents.forecaster import runway_metrics
+from app.services.daily_balances import load_daily_balances
+
+# 🟢 PRECOMPUTED FORECASTS
+# The nightly job refits only tenants whose transactions changed since their
+# snapshot: the watermark (transaction count, highest transaction id) moves on
+# every insert or delete, and comparing it is one grouped query for all tenants.
+# Edits in place (amount, date, owner) don't move it, so the daily_balances
+# hooks delete those users' snapshots instead (see app.services.daily_balances).
+
+Watermark = Tuple[int, int]  # (txn_count, max_txn_id)
+
+MIN_HISTORY_DAYS = 5  # Same floor as predict_runway
+
+
+def tenant_watermarks(db: Session, user_ids: Iterable[int]) -> Dict[int, Watermark]:
+    ids = list(user_ids)
+    marks = {}
+    for i in range(0, len(ids), 500):
+        rows = db.query(Transaction.user_id, func.count(Transaction.id), func.max(Transaction.id)).filter(
+            Transaction.user_id.in_(ids[i : i + 500])
+        ).group_by(Transaction.user_id).all()
+        marks.update({user_id: (count, max_id or 0) for user_id, count, max_id in rows})
+    return marks
+
+
+def stale_tenants(db: Session) -> List[int]:
+    """Users with transactions whose snapshot is missing or fitted on other data."""
+    marks = db.query(
+        Transaction.user_id.label("user_id"),
+        func.count(Transaction.id).label("txn_count"),
+        func.max(Transaction.id).label("max_txn_id"),
+    ).filter(Transaction.user_id.isnot(None)).group_by(Transaction.user_id).subquery()
+
+    rows = db.query(marks.c.user_id).outerjoin(
+        ForecastSnapshot, ForecastSnapshot.user_id == marks.c.user_id
+    ).filter(or_(
+        ForecastSnapshot.id.is_(None),
+        ForecastSnapshot.txn_count != marks.c.txn_count,
+        ForecastSnapshot.max_txn_id != marks.c.max_txn_id,
+    )).order_by(marks.c.user_id).all()
+    return [user_id for (user_id,) in rows]
+
+
+def load_balance_history(db: Session, user_id: int) -> pd.DataFrame:
+    """Daily cumulative balance ('ds', 'y'), built the way POST /forecast builds it."""
+    daily = load_daily_balances(db, user_id)
+    return pd.DataFrame({"ds": pd.to_datetime(daily["date"]), "y": daily["balance"]})
+
+
+def refresh_snapshot(db: Session, user_id: int) -> ForecastSnapshot:
+    """Refits one tenant and stores the result with its watermark. Caller commits."""
+    # Watermark first: rows arriving while we fit leave the snapshot stale for next run
+    mark = tenant_watermarks(db, [user_id]).get(user_id, (0, 0))
+    history = load_balance_history(db, user_id)
+
+    engine_name = None
+    if len(history) < MIN_HISTORY_DAYS:
+        result = {
+            "status": "insufficient_data",
+            "message": f"Need at least {MIN_HISTORY_DAYS} days of balance history to forecast."
+        }
+    else:
+        engine = select_engine(len(history))
+        engine_name = engine.name
+        result = runway_metrics(history, engine.forecast(history, periods=90))
+
+    snapshot = db.query(ForecastSnapshot).filter(ForecastSnapshot.user_id == user_id).first()
+    if snapshot is None:
+        snapshot = ForecastSnapshot(user_id=user_id)
+        db.add(snapshot)
+    snapshot.txn_count, snapshot.max_txn_id = mark
+    snapshot.engine = engine_name
+    snapshot.result = result
+    return snapshot
+
+
+def refresh_snapshots(db: Session, user_ids: Iterable[int]) -> dict:
+    """Refits the given tenants one by one; a failure only skips that tenant."""
+    refreshed, failed = 0, 0
+    for user_id in user_ids:
+        try:
+            refresh_snapshot(db, user_id)
+            db.commit()
+            refreshed += 1
+        except Exception as e:
+            db.rollback()
+            failed += 1
+            print(f"❌ Forecast snapshot failed for user {user_id}: {e}")
+    return {"refreshed": refreshed, "failed": failed}
@@ -1,18 +1,257 @@
+import asyncio
+import hashlib
+import os
+import signal
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import AsyncIterator, Deque, Dict, Iterator, Optional, Set, Tuple
+
 import pdfplumber
-from fastapi import UploadFile
-
-async def extract_text_from_pdf(file: UploadFile) -> str:
-    """
-    Reads a PDF file and returns a single raw text string.
-    """
-    text_content = ""
-    
-    # Open the uploaded file stream
-    with pdfplumber.open(file.file) as pdf:
-        for page in pdf.pages:
-            # Extract text and add a newline to separate rows
-            page_text = page.extract_text()
-            if page_text:
-                text_content += page_text + "\n"
-                
-    return text_content
\ No newline at end of file
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import settings
+
+# 🟢 PAGE-PARALLEL EXTRACTION ENGINE
+# pdfplumber is pure-Python and CPU bound, so pages are fanned out to a
+# process pool instead of being walked one by one on the event loop.
+_pool: Optional[ProcessPoolExecutor] = None
+# Pools are tracked by how many extractions are using them. A page timeout
+# retires the pool (new work goes to a fresh one) and its workers, one of them
+# still stuck on the bad page, are killed once the last extraction lets go.
+_pool_users: Dict[ProcessPoolExecutor, int] = {}
+_retired_pools: Set[ProcessPoolExecutor] = set()
+
+# Separator placed between pages when a document is flattened to one string.
+# The extractor splits on it to keep chunks aligned to page boundaries.
+PAGE_BREAK = "\f"
+
+
+class PDFPageTimeout(Exception):
+    """A page took longer than PDF_PAGE_TIMEOUT to extract."""
+
+# Per-worker-process handle on the last opened document, so consecutive
+# pages of the same statement don't re-parse the whole file every time.
+# Keyed by path plus file identity: temp names get reused once a file is deleted.
+_worker_pdf = None
+_worker_key: Optional[tuple] = None
+
+
+def _open_in_worker(path: str):
+    global _worker_pdf, _worker_key
+    info = os.stat(path)
+    key = (path, info.st_dev, info.st_ino, info.st_mtime_ns, info.st_size)
+    if _worker_key != key:
+        if _worker_pdf is not None:
+            _worker_pdf.close()
+        _worker_pdf = None
+        _worker_pdf = pdfplumber.open(path)
+        _worker_key = key
+    return _worker_pdf
+
+
+def _count_pages(path: str) -> int:
+    return len(_open_in_worker(path).pages)
+
+
+def _forget_worker_pdf():
+    global _worker_pdf, _worker_key
+    if _worker_pdf is not None:
+        try:
+            _worker_pdf.close()
+        except Exception:
+            pass
+    _worker_pdf = None
+    _worker_key = None
+
+
+@contextmanager
+def _deadline(seconds: float) -> Iterator[None]:
+    """
+    Raises PDFPageTimeout in the worker once `seconds` of actual work have passed.
+    Started inside the worker, so time spent queued behind other pages never counts.
+    """
+    if not seconds or not hasattr(signal, "setitimer"):
+        yield
+        return
+
+    def expire(signum, frame):
+        raise PDFPageTimeout(f"page took longer than {seconds}s to extract")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _extract_page(path: str, page_index: int, timeout: float = 0) -> str:
+    try:
+        with _deadline(timeout):
+            page = _open_in_worker(path).pages[page_index]
+            try:
+                return page.extract_text() or ""
+            finally:
+                # Drop the page's cached layout objects, otherwise a long statement
+                # keeps every parsed page alive inside the worker.
+                page.close()
+    except PDFPageTimeout:
+        # The parser was interrupted mid-page: don't reuse its half-built state
+        _forget_worker_pdf()
+        raise
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    """Returns the shared extraction pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.PDF_WORKERS)
+    return _pool
+
+
+def shutdown_pdf_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+    for pool in list(_retired_pools):
+        _kill_pool(pool)
+    _retired_pools.clear()
+    _pool_users.clear()
+
+
+def _kill_pool(pool: ProcessPoolExecutor):
+    # ProcessPoolExecutor can't kill a busy worker before Python 3.14
+    processes = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+
+
+def _acquire_pool() -> ProcessPoolExecutor:
+    pool = get_pdf_pool()
+    _pool_users[pool] = _pool_users.get(pool, 0) + 1
+    return pool
+
+
+def _release_pool(pool: ProcessPoolExecutor):
+    _pool_users[pool] = _pool_users.get(pool, 1) - 1
+    if _pool_users[pool] <= 0:
+        del _pool_users[pool]
+        if pool in _retired_pools:
+            _retired_pools.discard(pool)
+            _kill_pool(pool)
+
+
+def _retire_pool(pool: ProcessPoolExecutor):
+    """A worker is stuck: route new work to a fresh pool, kill this one when it's idle."""
+    global _pool
+    if _pool is pool:
+        _pool = None
+    _retired_pools.add(pool)
+
+
+async def spool_upload(file: UploadFile, max_bytes: Optional[int] = None) -> Tuple[str, str]:
+    """
+    Streams an upload to a temp file in fixed-size chunks.
+    Returns (path, sha256 hex digest of the content); the hash is computed on the
+    same pass so deduplication costs no extra read.
+    Only one chunk is held in memory at a time. The caller owns (and deletes) the file.
+    """
+    max_bytes = max_bytes or settings.UPLOAD_MAX_BYTES
+    suffix = os.path.splitext(file.filename or "")[1] or ".pdf"
+    tmp = tempfile.NamedTemporaryFile(suffix=suffix, dir=settings.UPLOAD_SPOOL_DIR, delete=False)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with tmp:
+            while chunk := await file.read(settings.UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"{file.filename} exceeds the {max_bytes // (1024 * 1024)} MB upload limit"
+                    )
+                digest.update(chunk)
+                await run_in_threadpool(tmp.write, chunk)
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
+    return tmp.name, digest.hexdigest()
+
+
+def _pages_in_flight() -> int:
+    return settings.PDF_PAGES_IN_FLIGHT or settings.PDF_WORKERS or os.cpu_count() or 1
+
+
+async def _page_result(pool: ProcessPoolExecutor, future: Future) -> str:
+    """
+    Waits for one page. The deadline itself runs inside the worker; this only
+    catches a worker that is wedged outside Python (where the alarm can't fire),
+    timed from when the pool hands the page to a worker.
+    """
+    loop = asyncio.get_running_loop()
+    waiter = asyncio.wrap_future(future)
+    started = None
+    while True:
+        done, _ = await asyncio.wait({waiter}, timeout=1.0)
+        if done:
+            return waiter.result()
+        if future.running():
+            started = started or loop.time()
+            if loop.time() - started > 2 * settings.PDF_PAGE_TIMEOUT:
+                # Its worker is stuck: don't let new uploads queue behind it
+                _retire_pool(pool)
+                raise PDFPageTimeout(f"worker stuck for over {2 * settings.PDF_PAGE_TIMEOUT}s")
+
+
+async def iter_pdf_pages(path: str) -> AsyncIterator[str]:
+    """
+    Streams the text of each page, in page order, as soon as it is ready.
+    Up to PDF_PAGES_IN_FLIGHT pages of the document are on the pool at once, so
+    later pages are extracted while the caller works on the first ones without
+    one long statement starving every other upload.
+    A page that exceeds PDF_PAGE_TIMEOUT fails the whole document: a skipped
+    page would silently drop its transactions.
+    """
+    global _pool
+    loop = asyncio.get_running_loop()
+    pool = _acquire_pool()
+    pending: Deque[Future] = deque()
+    try:
+        try:
+            page_count = await loop.run_in_executor(pool, _count_pages, path)
+            window = max(1, _pages_in_flight())
+            submitted = 0
+            for number in range(1, page_count + 1):
+                while submitted < page_count and len(pending) < window:
+                    pending.append(pool.submit(_extract_page, path, submitted, settings.PDF_PAGE_TIMEOUT))
+                    submitted += 1
+                try:
+                    text = await _page_result(pool, pending.popleft())
+                except PDFPageTimeout as e:
+                    print(f"⚠️ PDF page {number}/{page_count} timed out: {e}")
+                    raise ValueError(
+                        f"Page {number} of the PDF could not be read within {settings.PDF_PAGE_TIMEOUT:g}s."
+                    ) from e
+                # Top up before handing the page over, so the pool keeps working
+                # while the caller is busy with it
+                while submitted < page_count and len(pending) < window:
+                    pending.append(pool.submit(_extract_page, path, submitted, settings.PDF_PAGE_TIMEOUT))
+                    submitted += 1
+                yield text
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM on a hostile PDF). Rebuild the pool next time.
+            if _pool is pool:
+                _pool = None
+            raise
+    finally:
+        # Consumer stopped early (error, client gone): don't leave queued pages behind
+        for future in pending:
+            future.cancel()
+        _release_pool(pool)
@@ -0,0 +1,131 @@
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from langchain_core.documents import Document
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.category_cache import canonicalize_description
+from app.services.vector_store import get_vector_store, vector_store_manager
+
+# 🟢 WRITE-BEHIND BUFFER FOR LEARNED CATEGORIES
+# The normalizer hands newly learned (description, category) pairs to this
+# buffer and moves on. A background thread writes them to the vector store in
+# batches, so no request waits on an embeddings call or an index upsert.
+
+
+class LearnedCategoryBuffer:
+    """
+    Collects learned categories, deduplicated per tenant by canonical
+    description (the latest answer wins), and flushes them with one add_documents call when
+    `batch_size` entries are pending or `interval` seconds have passed.
+    Failed batches are put back and retried on the next flush; the buffer never
+    holds more than `max_pending` entries (the oldest are dropped first).
+    """
+
+    def __init__(self, batch_size: int, interval: float, max_pending: int):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[str, Document]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # One flush at a time (flusher thread or close())
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def add(self, description: str, category: str, source: str = "ai-learned", tenant: str = "default"):
+        # The tenant goes into the metadata so recall can be filtered to its owner
+        doc = Document(
+            page_content=description,
+            metadata={"category": category, "source": source, "tenant": tenant}
+        )
+        key = f"{tenant}:{canonicalize_description(description)}"
+        with self._cond:
+            self._pending.pop(key, None)
+            self._pending[key] = doc
+            self._trim()
+            metrics.incr("learning_buffer.queued")
+            metrics.set("learning_buffer.pending", len(self._pending))
+            self._ensure_started()
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def _trim(self):
+        while len(self._pending) > self.max_pending:
+            self._pending.popitem(last=False)
+            metrics.incr("learning_buffer.dropped")
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            if self._thread is None:
+                # Celery workers and scripts don't run the FastAPI shutdown hook
+                atexit.register(self.close)
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="learning-buffer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        backoff = False
+        while True:
+            with self._cond:
+                # After a failed flush, wait a full interval even if the batch is full
+                if not self._stopping and (backoff or len(self._pending) < self.batch_size):
+                    self._cond.wait(self.interval)
+                if self._stopping:
+                    return
+            backoff = self.flush() == 0
+
+    def flush(self) -> int:
+        """Writes everything pending. Returns how many documents were stored."""
+        with self._flush_lock:
+            with self._cond:
+                if not self._pending:
+                    return 0
+                batch = self._pending
+                self._pending = OrderedDict()
+
+            started = time.perf_counter()
+            try:
+                get_vector_store().add_documents(list(batch.values()))
+            except Exception as e:
+                vector_store_manager.report_failure(e)
+                metrics.incr("learning_buffer.flush_failures")
+                print(f"⚠️ LEARNING BUFFER FLUSH FAILED ({len(batch)} docs): {str(e)}")
+                with self._cond:
+                    # The failed batch is older than anything queued since: put it back
+                    # in front, so retries keep their order and the cap drops it first.
+                    # Newer answers for the same key win over it.
+                    requeued = OrderedDict((key, doc) for key, doc in batch.items() if key not in self._pending)
+                    requeued.update(self._pending)
+                    self._pending = requeued
+                    self._trim()
+                    metrics.set("learning_buffer.pending", len(self._pending))
+                return 0
+
+            vector_store_manager.report_success()
+            metrics.observe("learning_buffer.flush_seconds", time.perf_counter() - started)
+            metrics.incr("learning_buffer.flushed", len(batch))
+            with self._cond:
+                metrics.set("learning_buffer.pending", len(self._pending))
+            return len(batch)
+
+    def close(self, timeout: float = 10.0):
+        """Stops the flusher and writes whatever is still pending."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"pending": len(self._pending), "running": bool(self._thread and self._thread.is_alive())}
+
+
+learning_buffer = LearnedCategoryBuffer(
+    settings.LEARNING_BUFFER_BATCH_SIZE,
+    settings.LEARNING_BUFFER_FLUSH_SECONDS,
+    settings.LEARNING_BUFFER_MAX_PENDING,
+)
@@ -0,0 +1,311 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+from app.core.config import settings
+from app.core.metrics import metrics
+
+# 🟢 SHARED LLM SCHEDULER
+# Every Groq call (extraction chunks, categorization batches, single-row
+# fallbacks) goes through one scheduler per process:
+# - token buckets keep us under the provider's requests/min and tokens/min quota
+# - an AIMD limit finds the concurrency the provider tolerates: +1 per window of
+#   fast successes, halved on a 429, shrunk when latency drifts above target
+# - rate-limited calls are retried with jittered backoff, honouring "try again in"
+# - waiting calls are served round-robin per tenant, so one large upload can't
+#   starve everyone else's requests
+# The quota buckets and the AIMD limit are process-wide. The queues, in-flight
+# count and wake-up timer belong to one event loop (futures and timers can't
+# cross loops), so Celery's per-task loops each get their own.
+
+T = TypeVar("T")
+
+# Tenant the current task is working for (set at the start of a request / job)
+llm_tenant: ContextVar[str] = ContextVar("llm_tenant", default="default")
+
+_TRY_AGAIN = re.compile(r"try again in\s+(?:(\d+)h)?\s*(?:(\d+)m(?!s))?\s*(?:([\d.]+)(ms|s))?", re.IGNORECASE)
+
+
+class LLMRateLimitError(Exception):
+    """The provider kept throttling us after every retry. `retry_after` is in seconds."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_rate_limit(error: Exception) -> bool:
+    if getattr(error, "status_code", None) == 429:
+        return True
+    message = str(error)
+    return "rate_limit_exceeded" in message or "429" in message
+
+
+def is_transient(error: Exception) -> bool:
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int) and status >= 500:
+        return True
+    name = type(error).__name__
+    return isinstance(error, asyncio.TimeoutError) or "Timeout" in name or "Connection" in name
+
+
+def retry_after_hint(error: Exception) -> Optional[float]:
+    """Seconds the provider asked us to wait, from the Retry-After header or the error text."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        try:
+            return float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+
+    match = _TRY_AGAIN.search(str(error))
+    if not match or not any(match.groups()):
+        return None
+    hours, minutes, value, unit = match.groups()
+    seconds = int(hours or 0) * 3600 + int(minutes or 0) * 60
+    if value:
+        seconds += float(value) / (1000 if unit.lower() == "ms" else 1)
+    return seconds
+
+
+def format_wait(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "a few minutes"
+    minutes, secs = divmod(int(round(seconds)), 60)
+    return f"{minutes}m{secs}s"
+
+
+def estimate_tokens(*texts: str, completion: int = 0) -> int:
+    """Rough prompt size (~4 chars per token) plus the expected completion."""
+    return sum(len(text) for text in texts) // 4 + completion
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        amount = min(amount, self.capacity)  # A single oversized call must still fit eventually
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def drain(self):
+        self.tokens = min(self.tokens, 0.0)
+
+
+class _LoopState:
+    """Admission state of one event loop."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.queues: "OrderedDict[str, deque]" = OrderedDict()  # tenant -> waiting (future, cost)
+        self.wakeup: Optional[asyncio.TimerHandle] = None
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        initial_concurrency: int,
+        min_concurrency: int,
+        max_concurrency: int,
+        latency_target: float,
+        max_retries: int,
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.limit = float(initial_concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.max_retries = max_retries
+
+        self.paused_until = 0.0
+        self._quota_lock = threading.Lock()  # Buckets are shared by loops in different threads
+        self._loops: Dict[asyncio.AbstractEventLoop, _LoopState] = {}
+
+    # --- admission ---
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            # Forget loops that were closed (e.g. a finished Celery task's loop)
+            for old in [old for old in self._loops if old.is_closed()]:
+                del self._loops[old]
+            state = self._loops[loop] = _LoopState()
+        return state
+
+    def _dispatch(self, state: _LoopState):
+        state.wakeup = None
+        while state.queues and state.in_flight < int(self.limit):
+            tenant, queue = next(iter(state.queues.items()))
+            future, cost = queue[0]
+            if future.done():  # Cancelled while waiting
+                queue.popleft()
+                if not queue:
+                    del state.queues[tenant]
+                continue
+
+            with self._quota_lock:
+                now = time.monotonic()
+                wait = max(
+                    self.paused_until - now,
+                    self.requests.wait_time(1, now),
+                    self.tokens.wait_time(cost, now),
+                )
+                if wait <= 0:
+                    self.requests.take(1)
+                    self.tokens.take(cost)
+            if wait > 0:
+                self._schedule(state, wait)
+                return
+
+            state.in_flight += 1
+            queue.popleft()
+            # Round-robin: this tenant goes to the back of the line
+            del state.queues[tenant]
+            if queue:
+                state.queues[tenant] = queue
+            future.set_result(None)
+
+        metrics.set("llm.in_flight", sum(s.in_flight for s in list(self._loops.values())))
+        metrics.set("llm.waiting", sum(len(q) for s in list(self._loops.values()) for q in s.queues.values()))
+
+    def _schedule(self, state: _LoopState, delay: float):
+        if state.wakeup is None:
+            state.wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch, state)
+
+    async def _acquire(self, tenant: str, cost: int) -> _LoopState:
+        state = self._state()
+        future = asyncio.get_running_loop().create_future()
+        state.queues.setdefault(tenant, deque()).append((future, cost))
+        self._dispatch(state)
+        started = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(state)  # Admitted and cancelled in the same tick
+            raise
+        metrics.observe("llm.queue_seconds", time.monotonic() - started)
+        return state
+
+    def _release(self, state: _LoopState):
+        state.in_flight -= 1
+        self._dispatch(state)
+
+    # --- AIMD ---
+
+    def _on_success(self, latency: float):
+        if latency > self.latency_target:
+            self.limit = max(self.min_concurrency, self.limit * 0.9)
+        else:
+            self.limit = min(self.max_concurrency, self.limit + 1.0 / max(self.limit, 1.0))
+        metrics.set("llm.concurrency_limit", self.limit)
+
+    def _on_throttled(self, retry_after: Optional[float]):
+        self.limit = max(self.min_concurrency, self.limit / 2)
+        with self._quota_lock:
+            self.requests.drain()
+        if retry_after:
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        metrics.incr("llm.rate_limited")
+        metrics.set("llm.concurrency_limit", self.limit)
+
+    # --- public API ---
+
+    async def run(self, call: Callable[[], Awaitable[T]], tokens: int = 0, tenant: Optional[str] = None) -> T:
+        """
+        Runs `call` (a zero-argument coroutine factory) once the quota allows it,
+        retrying throttled and transient failures. Raises LLMRateLimitError when
+        the provider is still throttling after the last retry; other errors
+        propagate unchanged.
+        """
+        tenant = tenant or llm_tenant.get()
+        for attempt in range(self.max_retries + 1):
+            state = await self._acquire(tenant, tokens)
+            started = time.monotonic()
+            error: Optional[Exception] = None
+            try:
+                result = await call()
+            except Exception as e:
+                error = e
+            finally:
+                # Free the slot before any backoff: a sleeping retry mustn't hold it
+                self._release(state)
+
+            if error is None:
+                latency = time.monotonic() - started
+                self._on_success(latency)
+                metrics.incr("llm.calls")
+                metrics.observe("llm.call_seconds", latency)
+                self._settle_tokens(result, tokens)
+                return result
+
+            throttled = is_rate_limit(error)
+            if not throttled and not is_transient(error):
+                raise error
+            hint = retry_after_hint(error) if throttled else None
+            if throttled:
+                self._on_throttled(hint)
+            else:
+                metrics.incr("llm.transient_errors")
+            if attempt == self.max_retries:
+                if throttled:
+                    raise LLMRateLimitError(str(error), hint) from error
+                raise error
+            backoff = settings.LLM_BACKOFF_BASE_SECONDS * 2 ** attempt
+            delay = max(hint or 0.0, backoff) * random.uniform(1.0, 1.5)
+            print(f"⏳ LLM {'rate limited' if throttled else 'error'}, retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+            metrics.incr("llm.retries")
+            # The retry queues again like any other call (fairness + quota apply)
+            await asyncio.sleep(delay)
+
+    def _settle_tokens(self, result, estimated: int):
+        # Charge the bucket for what the call really used, when the client reports it
+        usage = getattr(result, "usage_metadata", None) or {}
+        actual = usage.get("total_tokens") if isinstance(usage, dict) else None
+        if actual:
+            with self._quota_lock:
+                self.tokens.tokens -= actual - estimated
+            metrics.incr("llm.tokens", actual)
+
+    def status(self) -> dict:
+        waiting: dict = {}
+        for state in list(self._loops.values()):
+            for tenant, queue in list(state.queues.items()):
+                waiting[tenant] = waiting.get(tenant, 0) + len(queue)
+        return {
+            "concurrency_limit": round(self.limit, 2),
+            "in_flight": sum(state.in_flight for state in list(self._loops.values())),
+            "waiting": waiting,
+            "paused_for": max(0.0, round(self.paused_until - time.monotonic(), 1)),
+        }
+
+
+llm_scheduler = LLMScheduler(
+    requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+    initial_concurrency=settings.LLM_INITIAL_CONCURRENCY,
+    min_concurrency=settings.LLM_MIN_CONCURRENCY,
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    latency_target=settings.LLM_LATENCY_TARGET_SECONDS,
+    max_retries=settings.LLM_MAX_RETRIES,
+)
@@ -0,0 +1,299 @@
+import json
+import os
+import re
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory file locks
+    fcntl = None
+
+# 🟢 LOCAL VECTOR BACKEND
+# In-process replacement for Pinecone + OpenAI embeddings: a brute-force cosine
+# index over a memory-mapped float32 matrix. Categorization memory keeps working
+# with no network, and recall over tens of thousands of merchants is a single
+# matrix-vector product.
+# Several processes (uvicorn workers, Celery) may share one LOCAL_VECTOR_DIR:
+# writes hold an exclusive flock on the directory's lock file, and readers pick
+# up rows added elsewhere when the header changes. Without fcntl (Windows) only
+# one process may use a directory.
+
+_TOKENS = re.compile(r"[a-z]+")
+
+
+class HashingEmbeddings:
+    """
+    Dependency-free embedding model: word tokens and character trigrams are
+    feature-hashed into a fixed-size, L2-normalized vector. Digits are ignored,
+    since in bank descriptions they are references, dates and card numbers.
+    Deterministic across processes (crc32, not Python's salted hash) so
+    persisted vectors stay valid.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = _TOKENS.findall(text.lower())
+        features = list(words)
+        for word in words:
+            padded = f" {word} "
+            features.extend(padded[i : i + 3] for i in range(len(padded) - 2))
+        for feature in features:
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text).tolist()
+
+    def embed_matrix(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self._embed(text) for text in texts])
+
+
+class SentenceTransformerEmbeddings:
+    """Local neural embeddings (optional dependency: sentence-transformers)."""
+
+    def __init__(self, model_name: str):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise RuntimeError("LOCAL_EMBEDDING_MODEL requires the 'sentence-transformers' package.")
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"st-{model_name}"
+
+    def embed_matrix(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_matrix(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_matrix([text])[0].tolist()
+
+
+class LocalVectorStore:
+    """
+    Persistent cosine-similarity index with incremental adds.
+
+    Layout of `directory`:
+    - vectors.f32  raw float32 matrix (capacity x dim), memory-mapped
+    - meta.jsonl   one {"text", "metadata"} line per stored vector, append-only
+    - header.json  dim, row count and the embedding model name
+    - .lock        flock target serializing writers across processes
+
+    Implements the subset of the LangChain VectorStore API the normalizer uses.
+    """
+
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self, directory: str, embeddings):
+        self.directory = directory
+        self.embeddings = embeddings
+        self.dim = embeddings.dim
+        self._lock = threading.Lock()
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._meta_path = os.path.join(directory, "meta.jsonl")
+        self._header_path = os.path.join(directory, "header.json")
+        self._lock_path = os.path.join(directory, ".lock")
+        os.makedirs(directory, exist_ok=True)
+        with self._file_lock(exclusive=True):
+            self._load()
+
+    # --- persistence ---
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        if fcntl is None:
+            yield
+            return
+        with open(self._lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_header(self) -> Optional[dict]:
+        if not os.path.exists(self._header_path):
+            return None
+        with open(self._header_path) as f:
+            header = json.load(f)
+        if header.get("dim") != self.dim or header.get("model") != self.embeddings.name:
+            raise RuntimeError(
+                f"Local vector index at {self.directory} was built with {header.get('model')}; "
+                f"rebuild it or point LOCAL_VECTOR_DIR elsewhere."
+            )
+        return header
+
+    def _header_version(self):
+        try:
+            stat = os.stat(self._header_path)
+        except FileNotFoundError:
+            return None
+        # The header is replaced atomically, so a new inode means a new count
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def _load(self):
+        """Initial load; caller holds the exclusive file lock."""
+        self.texts: List[str] = []
+        self.metadatas: List[dict] = []
+        self.count = 0
+        self._meta_offset = 0
+        self._version = self._header_version()
+
+        header = self._read_header()
+        if header is not None:
+            self._read_meta(header["count"])
+            with open(self._meta_path, "rb+") as f:
+                # Drop metadata lines written by an add that crashed before its header update
+                f.truncate(self._meta_offset)
+
+        self._open_matrix(max(self.INITIAL_CAPACITY, self.count))
+
+    def _read_meta(self, count: int):
+        """Appends metadata rows up to `count`, continuing from where the last read stopped."""
+        with open(self._meta_path, "rb") as f:
+            f.seek(self._meta_offset)
+            for _ in range(count - self.count):
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break
+                row = json.loads(line)
+                self.texts.append(row["text"])
+                self.metadatas.append(row["metadata"])
+                self._meta_offset = f.tell()
+        self.count = len(self.texts)
+
+    def _refresh(self):
+        """Picks up rows other processes added since we last looked. Caller holds self._lock."""
+        if self._header_version() == self._version:
+            return
+        with self._file_lock(exclusive=False):
+            self._catch_up()
+
+    def _catch_up(self):
+        """Caller holds self._lock and a file lock (flock isn't reentrant across open files)."""
+        self._version = self._header_version()
+        header = self._read_header()
+        count = header["count"] if header else 0
+        if count <= self.count:
+            return
+        if count > self.capacity:
+            self._matrix.flush()
+            self._open_matrix(count)
+        self._read_meta(count)
+
+    def _open_matrix(self, capacity: int):
+        needed = capacity * self.dim * 4
+        if not os.path.exists(self._vectors_path) or os.path.getsize(self._vectors_path) < needed:
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(needed)
+        self.capacity = os.path.getsize(self._vectors_path) // (self.dim * 4)
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+
+    def _write_header(self):
+        tmp = self._header_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"dim": self.dim, "count": self.count, "model": self.embeddings.name}, f)
+        os.replace(tmp, self._header_path)
+
+    # --- writes ---
+
+    def add_texts(self, texts: List[str], metadatas: Optional[List[dict]] = None) -> List[str]:
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = self.embeddings.embed_matrix(list(texts))
+
+        with self._lock, self._file_lock(exclusive=True):
+            # Append after whatever other processes wrote, never over it
+            self._catch_up()
+            start = self.count
+            end = start + len(texts)
+            if end > self.capacity:
+                self._matrix.flush()
+                self._open_matrix(max(end, self.capacity * 2))
+
+            self._matrix[start:end] = vectors
+            self._matrix.flush()
+            with open(self._meta_path, "ab") as f:
+                for text, metadata in zip(texts, metadatas):
+                    f.write((json.dumps({"text": text, "metadata": metadata}) + "\n").encode("utf-8"))
+                self._meta_offset = f.tell()
+
+            self.texts.extend(texts)
+            self.metadatas.extend(metadatas)
+            # Header last: a crash mid-write leaves the previous, consistent count
+            self.count = end
+            self._write_header()
+            self._version = self._header_version()
+        return [str(i) for i in range(start, end)]
+
+    def add_documents(self, documents: List[Document]) -> List[str]:
+        return self.add_texts([doc.page_content for doc in documents], [dict(doc.metadata) for doc in documents])
+
+    # --- reads ---
+
+    def _top_k(self, scores: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, scores.shape[-1])
+        top = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+        order = np.take_along_axis(scores, top, axis=-1).argsort(axis=-1)[..., ::-1]
+        return np.take_along_axis(top, order, axis=-1)
+
+    def _hits(self, scores: np.ndarray, rows: Sequence[int], indices: np.ndarray) -> List[Tuple[Document, float]]:
+        return [
+            (Document(page_content=self.texts[rows[i]], metadata=self.metadatas[rows[i]]), float(scores[i]))
+            for i in indices
+        ]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[dict] = None
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_many([query], k=k, filter=filter)[0]
+
+    def similarity_search_many(
+        self, texts: List[str], k: int = 1, filter: Optional[dict] = None
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        All queries scored in one matrix product against the stored vectors.
+        `filter` keeps only rows whose metadata equals every given value
+        (the {"field": value} subset of Pinecone's filter syntax).
+        """
+        if not texts:
+            return []
+        with self._lock:
+            self._refresh()
+            count, matrix = self.count, self._matrix
+            metadatas = self.metadatas[:count]
+        rows = range(count)
+        candidates = matrix[:count]
+        if filter:
+            rows = [
+                i for i, metadata in enumerate(metadatas)
+                if all(metadata.get(field) == value for field, value in filter.items())
+            ]
+            candidates = matrix[rows]
+        if not rows:
+            return [[] for _ in texts]
+        queries = self.embeddings.embed_matrix(list(texts))
+        scores = queries @ candidates.T
+        top = self._top_k(scores, k)
+        return [self._hits(row_scores, rows, row_top) for row_scores, row_top in zip(scores, top)]
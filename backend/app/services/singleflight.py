@@ -0,0 +1,85 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, TypeVar
+from app.core.metrics import metrics
+
+# 🟢 SINGLEFLIGHT
+# Concurrent callers asking for the same key share one in-flight call instead of
+# racing each other to the LLM / vector store before any cache is filled.
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    The first caller for a key starts the work as a task; callers arriving while
+    it runs await the same task. Cancelling one caller doesn't cancel the work for
+    the others. The key is forgotten as soon as the call finishes, so results are
+    never cached here (that is the caller's cache's job).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _, key=key: self._calls.pop(key, None))
+            self.leaders += 1
+            metrics.incr(f"{self.name}.leaders")
+        else:
+            self.coalesced += 1
+            metrics.incr(f"{self.name}.coalesced")
+        metrics.set(f"{self.name}.coalescing_ratio", self.ratio())
+        return await asyncio.shield(task)
+
+    async def do_many(self, keys: List[str], fn: Callable[[List[str]], Awaitable[Dict[str, T]]]) -> Dict[str, T]:
+        """
+        Batch form of do(). Keys already in flight are joined; the rest are led
+        by a single fn(led_keys) call, which must return a result for each key it
+        is given. Every led key is registered on its own, so a later do() or
+        do_many() for any one of them waits on this batch.
+        """
+        tasks: Dict[str, asyncio.Task] = {}
+        led = []
+        for key in dict.fromkeys(keys):
+            if key in self._calls:
+                tasks[key] = self._calls[key]
+            else:
+                led.append(key)
+
+        if led:
+            batch = asyncio.ensure_future(fn(led))
+            for key in led:
+                task = asyncio.ensure_future(self._pick(batch, key))
+                self._calls[key] = task
+                task.add_done_callback(lambda _, key=key: self._calls.pop(key, None))
+                tasks[key] = task
+
+        self.leaders += len(led)
+        self.coalesced += len(tasks) - len(led)
+        metrics.incr(f"{self.name}.leaders", len(led))
+        metrics.incr(f"{self.name}.coalesced", len(tasks) - len(led))
+        metrics.set(f"{self.name}.coalescing_ratio", self.ratio())
+        return {key: await asyncio.shield(task) for key, task in tasks.items()}
+
+    @staticmethod
+    async def _pick(batch: "asyncio.Future[Dict[str, T]]", key: str) -> T:
+        return (await batch)[key]
+
+    def ratio(self) -> float:
+        """Share of calls that were answered by another caller's in-flight request."""
+        total = self.leaders + self.coalesced
+        return self.coalesced / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "coalescing_ratio": self.ratio(),
+        }
@@ -0,0 +1,257 @@
+import csv
+import os
+import re
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import dateparser
+from app.schemas.transaction import TransactionInput
+
+# 🟢 STRUCTURED IMPORTS (CSV / OFX / XLSX)
+# Bank exports that are already tabular never need pdfplumber or the extractor
+# LLM. Rows are streamed, mapped to our columns by header name and turned into
+# TransactionInput directly.
+
+STRUCTURED_FORMATS = {"csv", "ofx", "xlsx"}
+
+# Header aliases per target field, most specific first
+COLUMN_ALIASES: Dict[str, Sequence[str]] = {
+    "date": ("transaction date", "trans date", "trans. date", "posting date", "posted date",
+             "booking date", "date/time", "date", "value date"),
+    "description": ("description", "narration", "transaction details", "details", "remarks",
+                    "particulars", "memo", "reference"),
+    "amount": ("amount", "transaction amount", "amount (ngn)", "value"),
+    "debit": ("debit", "debits", "money out", "withdrawal", "withdrawals", "paid out", "dr"),
+    "credit": ("credit", "credits", "money in", "deposit", "deposits", "paid in", "cr"),
+    "vendor": ("vendor", "merchant", "payee", "counterparty", "to / from", "beneficiary", "name"),
+}
+
+DATE_FORMATS = (
+    "%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%d-%b-%Y", "%d-%b-%y", "%d %b %Y",
+    "%Y/%m/%d", "%m/%d/%Y", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M",
+)
+
+HEADER_SCAN_ROWS = 25  # Bank CSVs often have a preamble (account name, period...) above the header
+
+_MONEY_CLEAN = re.compile(r"[^\d.\-]")
+_HEADER_SPACES = re.compile(r"\s+")
+_OFX_BLOCK = re.compile(r"<STMTTRN>(.*?)</STMTTRN>", re.IGNORECASE | re.DOTALL)
+_OFX_FIELD = re.compile(r"<(DTPOSTED|TRNAMT|NAME|MEMO|PAYEE)>([^<\r\n]*)", re.IGNORECASE)
+
+
+def sniff_format(path: str, filename: Optional[str] = None) -> str:
+    """Identifies the upload by its magic bytes first, file extension second."""
+    with open(path, "rb") as f:
+        head = f.read(4096)
+
+    if head.startswith(b"%PDF"):
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        return "xlsx"
+    upper = head.upper()
+    if b"OFXHEADER" in upper or b"<OFX>" in upper:
+        return "ofx"
+
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext in (".ofx", ".qfx"):
+        return "ofx"
+    if ext in (".xlsx", ".xlsm"):
+        return "xlsx"
+    if ext in (".csv", ".txt"):
+        return "csv"
+    try:
+        sample = head.decode("utf-8")
+        csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        return "csv"
+    except (UnicodeDecodeError, csv.Error):
+        return "pdf"
+
+
+class _DateParser:
+    """
+    Remembers the first format that works, so most rows cost one strptime, and
+    memoizes values (a statement only has a few hundred distinct dates).
+    """
+
+    def __init__(self):
+        self.fmt: Optional[str] = None
+        self.seen: Dict[str, Optional[datetime]] = {}
+
+    def __call__(self, value) -> Optional[datetime]:
+        if isinstance(value, datetime):
+            return value
+        if value is None:
+            return None
+        text = str(value).strip()
+        if not text:
+            return None
+        if text in self.seen:
+            return self.seen[text]
+        parsed = self._parse(text)
+        if len(self.seen) < 10000:
+            self.seen[text] = parsed
+        return parsed
+
+    def _parse(self, text: str) -> Optional[datetime]:
+        if self.fmt:
+            try:
+                return datetime.strptime(text, self.fmt)
+            except ValueError:
+                pass
+        for fmt in DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(text, fmt)
+                self.fmt = fmt
+                return parsed
+            except ValueError:
+                continue
+        return dateparser.parse(text)
+
+
+def _parse_money(value) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    if not text or text == "-":
+        return None
+    negative = text.startswith("(") and text.endswith(")")
+    cleaned = _MONEY_CLEAN.sub("", text)
+    if not cleaned or cleaned in ("-", "."):
+        return None
+    try:
+        amount = float(cleaned)
+    except ValueError:
+        return None
+    return -amount if negative else amount
+
+
+def _map_header(row: Sequence) -> Optional[Dict[str, int]]:
+    normalized = [_HEADER_SPACES.sub(" ", str(cell or "")).strip().lower() for cell in row]
+    positions = {name: i for i, name in reversed(list(enumerate(normalized))) if name}
+    mapping = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in positions and positions[alias] not in mapping.values():
+                mapping[field] = positions[alias]
+                break
+    has_amount = "amount" in mapping or "debit" in mapping or "credit" in mapping
+    if "date" in mapping and has_amount:
+        return mapping
+    return None
+
+
+def _rows_to_transactions(rows: Iterable[Sequence]) -> Iterator[TransactionInput]:
+    """Finds the header row, then maps every following row by column position."""
+    rows = iter(rows)
+    mapping = None
+    for _, row in zip(range(HEADER_SCAN_ROWS), rows):
+        mapping = _map_header(row)
+        if mapping:
+            break
+    if not mapping:
+        raise ValueError("Could not find a header row with date and amount columns.")
+
+    parse_date = _DateParser()
+    i_date = mapping["date"]
+    i_desc = mapping.get("description")
+    i_amount = mapping.get("amount")
+    i_debit = mapping.get("debit")
+    i_credit = mapping.get("credit")
+    i_vendor = mapping.get("vendor")
+
+    for row in rows:
+        width = len(row)
+        if i_date >= width:
+            continue
+        date = parse_date(row[i_date])
+        if date is None:
+            continue
+
+        amount = _parse_money(row[i_amount]) if i_amount is not None and i_amount < width else None
+        if amount is None:
+            debit = _parse_money(row[i_debit]) if i_debit is not None and i_debit < width else None
+            credit = _parse_money(row[i_credit]) if i_credit is not None and i_credit < width else None
+            amount = debit if debit else credit
+        if amount is None:
+            continue
+
+        description = str(row[i_desc]).strip() if i_desc is not None and i_desc < width and row[i_desc] else ""
+        vendor = str(row[i_vendor]).strip() if i_vendor is not None and i_vendor < width and row[i_vendor] else None
+
+        # Already parsed and typed above, so skip per-row pydantic validation.
+        # Amounts are unsigned, matching what the extractor produces for PDFs.
+        yield TransactionInput.model_construct(
+            date=date,
+            description=description or vendor or "Unknown Transaction",
+            amount=abs(amount),
+            vendor=vendor or description or None,
+        )
+
+
+def iter_csv_transactions(path: str) -> Iterator[TransactionInput]:
+    with open(path, "r", encoding="utf-8-sig", errors="replace", newline="") as f:
+        sample = f.read(8192)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        yield from _rows_to_transactions(csv.reader(f, dialect))
+
+
+def iter_xlsx_transactions(path: str) -> Iterator[TransactionInput]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("XLSX support requires the 'openpyxl' package.")
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from _rows_to_transactions(workbook.active.iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+
+def iter_ofx_transactions(path: str, block_size: int = 1024 * 1024) -> Iterator[TransactionInput]:
+    """Streams <STMTTRN> blocks out of an OFX/QFX file (SGML v1 or XML v2)."""
+    parse_date = _DateParser()
+    parse_date.fmt = "%Y%m%d"
+
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        buffer = ""
+        while True:
+            block = f.read(block_size)
+            buffer += block
+            last_end = 0
+            for match in _OFX_BLOCK.finditer(buffer):
+                last_end = match.end()
+                fields = {name.upper(): value.strip() for name, value in _OFX_FIELD.findall(match.group(1))}
+                amount = _parse_money(fields.get("TRNAMT"))
+                # DTPOSTED looks like 20260402120000.000[-5:EST]; the day is enough
+                date = parse_date(fields.get("DTPOSTED", "")[:8])
+                if amount is None or date is None:
+                    continue
+                name = fields.get("NAME") or fields.get("PAYEE") or ""
+                memo = fields.get("MEMO") or ""
+                yield TransactionInput.model_construct(
+                    date=date,
+                    description=" ".join(part for part in (name, memo) if part) or "Unknown Transaction",
+                    amount=abs(amount),
+                    vendor=name or None,
+                )
+            buffer = buffer[last_end:]
+            if not block:
+                break
+
+
+def load_structured_transactions(path: str, fmt: str) -> List[TransactionInput]:
+    """Blocking: run it in a threadpool from async code."""
+    if fmt == "csv":
+        return list(iter_csv_transactions(path))
+    if fmt == "ofx":
+        return list(iter_ofx_transactions(path))
+    if fmt == "xlsx":
+        return list(iter_xlsx_transactions(path))
+    raise ValueError(f"Unsupported structured format: {fmt}")
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.audit import AuditLog
+
+# 🟢 RE-UPLOAD CACHE
+# Completed audits that carry a content_hash are the cache entries. Lookups are
+# always scoped to one user, so tenants never see each other's results.
+
+
+def find_reusable_audit(db: Session, user_id: int, content_hash: str) -> Optional[AuditLog]:
+    """
+    Returns the newest completed audit of the same file for this user, if it is
+    still inside the TTL window.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=settings.UPLOAD_CACHE_TTL_DAYS)
+    return db.query(AuditLog).filter(
+        AuditLog.user_id == user_id,
+        AuditLog.content_hash == content_hash,
+        AuditLog.status == "completed",
+        AuditLog.findings.isnot(None),
+        AuditLog.completed_at >= cutoff
+    ).order_by(AuditLog.completed_at.desc()).first()
+
+
+def clone_audit(source: AuditLog, filename: str) -> AuditLog:
+    """Builds a new, already completed audit log carrying the cached results."""
+    return AuditLog(
+        user_id=source.user_id,
+        filename=filename,
+        status="completed",
+        risk_score=source.risk_score,
+        findings=source.findings,
+        completed_at=datetime.utcnow(),
+        content_hash=source.content_hash,
+    )
+
+
+def evict_stale_entries(db: Session, user_id: int):
+    """
+    Eviction policy: entries older than the TTL, and everything beyond the newest
+    UPLOAD_CACHE_MAX_PER_USER entries of the user, stop being reusable.
+    The audit logs themselves are kept; only their hash is cleared.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=settings.UPLOAD_CACHE_TTL_DAYS)
+    db.query(AuditLog).filter(
+        AuditLog.user_id == user_id,
+        AuditLog.content_hash.isnot(None),
+        AuditLog.completed_at < cutoff
+    ).update({AuditLog.content_hash: None}, synchronize_session=False)
+
+    overflow_ids = [row.id for row in db.query(AuditLog.id).filter(
+        AuditLog.user_id == user_id,
+        AuditLog.content_hash.isnot(None),
+        AuditLog.status == "completed"
+    ).order_by(AuditLog.completed_at.desc()).offset(settings.UPLOAD_CACHE_MAX_PER_USER).all()]
+
+    if overflow_ids:
+        db.query(AuditLog).filter(AuditLog.id.in_(overflow_ids)).update(
+            {AuditLog.content_hash: None}, synchronize_session=False
+        )
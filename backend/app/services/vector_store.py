@@ -1,20 +1,225 @@
-from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
+import threading
+import time
+from typing import List, Optional, Tuple
+from langchain_core.documents import Document
 from app.core.config import settings
+from app.core.metrics import metrics
+
+
+def _resolve_backend() -> str:
+    """'pinecone' or 'local'. 'auto' picks Pinecone only when its keys are configured."""
+    backend = settings.VECTOR_BACKEND.lower()
+    if backend == "auto":
+        configured = settings.PINECONE_API_KEY and settings.PINECONE_INDEX_NAME and settings.OPENAI_API_KEY
+        return "pinecone" if configured else "local"
+    return backend
+
+
+def recall_threshold(embeddings) -> float:
+    """
+    Minimum similarity for a memory recall with `embeddings`. Scores aren't
+    comparable across models, so the cut-off follows the embedder in use.
+    """
+    if getattr(embeddings, "name", "").startswith("hashing-"):
+        return settings.HASHING_RECALL_THRESHOLD
+    return settings.VECTOR_RECALL_THRESHOLD
+
+
+class VectorStoreManager:
+    """
+    Process-wide owner of the vector backend (Pinecone + OpenAI embeddings, or
+    the in-process LocalVectorStore, see VECTOR_BACKEND).
+    Clients are built once, on first use, and reused by every request so their
+    HTTP connection pools stay warm. After repeated errors the manager pings the
+    index on a background thread and, if it is unreachable, drops the clients so
+    the next call reconnects.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._store = None
+        self._index = None
+        self._embeddings = None
+        self.backend: Optional[str] = None
+        self._failed_at: Optional[float] = None
+        self._consecutive_failures = 0
+        self._checking = False
+
+    @property
+    def recall_threshold(self) -> float:
+        return recall_threshold(self._embeddings)
+
+    def get(self):
+        store = self._store
+        if store is not None:
+            return store
+
+        with self._lock:
+            if self._store is None:
+                # Don't pay a connect attempt per transaction while the service is down
+                if self._failed_at and time.monotonic() - self._failed_at < settings.VECTOR_STORE_RETRY_SECONDS:
+                    raise RuntimeError("Vector store unavailable (waiting before reconnecting)")
+                try:
+                    self._connect()
+                except Exception:
+                    self._failed_at = time.monotonic()
+                    metrics.incr("vector_store.connect_failures")
+                    raise
+            return self._store
+
+    def _connect(self):
+        started = time.perf_counter()
+        backend = _resolve_backend()
+        if backend == "local":
+            self._connect_local()
+        elif backend == "pinecone":
+            self._connect_pinecone()
+        else:
+            raise RuntimeError(f"Unknown VECTOR_BACKEND: {settings.VECTOR_BACKEND}")
+
+        self.backend = backend
+        self._failed_at = None
+        self._consecutive_failures = 0
+        metrics.incr("vector_store.connects")
+        metrics.observe("vector_store.connect_seconds", time.perf_counter() - started)
+        print(f"🔌 Vector store connected ({backend})")
+
+    def _connect_local(self):
+        from app.services.local_vector_store import HashingEmbeddings, LocalVectorStore, SentenceTransformerEmbeddings
+
+        if settings.LOCAL_EMBEDDING_MODEL:
+            embeddings = SentenceTransformerEmbeddings(settings.LOCAL_EMBEDDING_MODEL)
+        else:
+            embeddings = HashingEmbeddings(settings.LOCAL_EMBEDDING_DIM)
+        self._embeddings = embeddings
+        self._index = None
+        self._store = LocalVectorStore(settings.LOCAL_VECTOR_DIR, embeddings)
+
+    def _connect_pinecone(self):
+        from langchain_openai import OpenAIEmbeddings
+        from langchain_pinecone import PineconeVectorStore
+        from pinecone import Pinecone
+
+        embeddings = OpenAIEmbeddings(
+            model="text-embedding-3-small",
+            api_key=settings.OPENAI_API_KEY
+        )
+        client = Pinecone(api_key=settings.PINECONE_API_KEY, pool_threads=settings.VECTOR_STORE_POOL_THREADS)
+        index = client.Index(settings.PINECONE_INDEX_NAME, pool_threads=settings.VECTOR_STORE_POOL_THREADS)
+
+        self._embeddings = embeddings
+        self._index = index
+        self._store = PineconeVectorStore(index=index, embedding=embeddings)
+
+    def similarity_search_many(
+        self, texts: List[str], k: int = 1, filter: Optional[dict] = None
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Bulk recall for a whole statement: all texts are embedded in one
+        embeddings request, then the nearest-neighbour queries are fired together
+        on the index's connection pool and collected. Blocking; run in a threadpool.
+        `filter` restricts matches by metadata ({"field": value}).
+        """
+        if not texts:
+            return []
+        self.get()
+        # One consistent snapshot of the clients: reset() may clear them mid-call
+        with self._lock:
+            store, embeddings, index = self._store, self._embeddings, self._index
+        if store is None:
+            raise RuntimeError("Vector store was reset while in use")
+        if hasattr(store, "similarity_search_many"):
+            # Local backend: one embedding pass + one matrix product
+            with metrics.timer("vector_store.bulk_query_seconds"):
+                return store.similarity_search_many(texts, k=k, filter=filter)
+
+        with metrics.timer("vector_store.bulk_embed_seconds"):
+            vectors = embeddings.embed_documents(texts)
+
+        with metrics.timer("vector_store.bulk_query_seconds"):
+            pending = [
+                index.query(vector=vector, top_k=k, filter=filter, include_metadata=True, async_req=True)
+                for vector in vectors
+            ]
+            responses = [request.get() for request in pending]
+
+        results = []
+        for response in responses:
+            hits = []
+            for match in response["matches"]:
+                metadata = dict(match.get("metadata") or {})
+                text = metadata.pop("text", "")
+                hits.append((Document(page_content=text, metadata=metadata), match["score"]))
+            results.append(hits)
+        metrics.incr("vector_store.bulk_lookups", len(texts))
+        return results
+
+    def health_check(self) -> bool:
+        """Pings the index. Drops the clients if it can't be reached."""
+        try:
+            self.get()
+            if self._index is not None:
+                self._index.describe_index_stats()
+            return True
+        except Exception as e:
+            print(f"⚠️ Vector store health check failed: {e}")
+            self.reset()
+            return False
+
+    def report_success(self):
+        self._consecutive_failures = 0
+
+    def report_failure(self, error: Exception):
+        """
+        Called by users of the store when an operation fails. Never blocks: the
+        health check (a network round trip) runs on its own thread, one at a time.
+        """
+        metrics.incr("vector_store.errors")
+        self._consecutive_failures += 1
+        if self._consecutive_failures < settings.VECTOR_STORE_MAX_FAILURES:
+            return
+        with self._lock:
+            if self._checking:
+                return
+            self._checking = True
+            self._consecutive_failures = 0
+        threading.Thread(target=self._background_check, name="vector-store-health", daemon=True).start()
+
+    def _background_check(self):
+        try:
+            self.health_check()
+        finally:
+            self._checking = False
+
+    def reset(self):
+        with self._lock:
+            self._store = None
+            self._index = None
+            self._embeddings = None
+            self._failed_at = time.monotonic()
+
+    def status(self) -> dict:
+        return {
+            "backend": self.backend,
+            "connected": self._store is not None,
+            "consecutive_failures": self._consecutive_failures,
+        }
+
+
+vector_store_manager = VectorStoreManager()
+
 
 def get_vector_store():
     """
-    Returns the initialized Pinecone Vector Store.
-    Uses OpenAI Embeddings (1536 dimensions) to translate text to numbers.
+    Returns the initialized Vector Store: Pinecone with OpenAI Embeddings
+    (1536 dimensions), or the local on-disk index when VECTOR_BACKEND selects it.
+    The instance is shared process-wide; see VectorStoreManager.
     """
-    embeddings = OpenAIEmbeddings(
-        model="text-embedding-3-small", 
-        api_key=settings.OPENAI_API_KEY
-    )
-    
-    vector_store = PineconeVectorStore(
-        index_name=settings.PINECONE_INDEX_NAME,
-        embedding=embeddings,
-        pinecone_api_key=settings.PINECONE_API_KEY
-    )
-    return vector_store
\ No newline at end of file
+    return vector_store_manager.get()
+
+
+def bulk_similarity_search(
+    texts: List[str], k: int = 1, filter: Optional[dict] = None
+) -> List[List[Tuple[Document, float]]]:
+    """Top-k matches for every text, in input order (see VectorStoreManager.similarity_search_many)."""
+    return vector_store_manager.similarity_search_many(texts, k=k, filter=filter)
@@ -0,0 +1,137 @@
+import math
+from typing import Dict, Iterable, List, Tuple
+import pandas as pd
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models.transactions import Transaction
+from app.models.vendor_stats import VendorStats
+from app.services.duplicate_detector import duplicate_key
+from app.services.daily_balances import record_inserted
+
+# 🟢 INCREMENTAL VENDOR STATISTICS
+# Each stored statement is folded into per-(user, vendor) count / mean / M2 with
+# Chan's parallel form of Welford's update, so a vendor's baseline costs one row
+# read no matter how long the user's history is.
+
+Stats = Tuple[int, float, float]  # (count, mean, m2)
+
+
+def vendor_key(vendor) -> str:
+    """The auditor's vendor identity: the name as extracted, or "Unknown"."""
+    return vendor if vendor else "Unknown"
+
+
+def merge_stats(a: Stats, b: Stats) -> Stats:
+    """Combines two (count, mean, m2) summaries exactly (Chan et al.)."""
+    n_a, mean_a, m2_a = a
+    n_b, mean_b, m2_b = b
+    if n_a == 0:
+        return b
+    if n_b == 0:
+        return a
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / n
+    m2 = m2_a + m2_b + delta * delta * n_a * n_b / n
+    return n, mean, m2
+
+
+def summarize(amounts_by_vendor: Iterable[Tuple[str, float]]) -> Dict[str, Stats]:
+    """Welford's single-pass (count, mean, m2) per vendor."""
+    summary: Dict[str, List[float]] = {}
+    for vendor, amount in amounts_by_vendor:
+        entry = summary.setdefault(vendor, [0, 0.0, 0.0])
+        entry[0] += 1
+        delta = amount - entry[1]
+        entry[1] += delta / entry[0]
+        entry[2] += delta * (amount - entry[1])
+    return {vendor: (int(n), mean, m2) for vendor, (n, mean, m2) in summary.items()}
+
+
+def load_vendor_baselines(db: Session, user_id: int, vendors: Iterable[str]) -> pd.DataFrame:
+    """
+    Baselines for the given vendors in the shape auditor.vendor_baselines
+    returns (index vendor; mean, std, threshold), read from VendorStats.
+    """
+    wanted = list(set(vendors))
+    rows = []
+    # Chunked IN (...) keeps us under SQLite's bound-parameter limit
+    for i in range(0, len(wanted), 500):
+        rows += db.query(VendorStats.vendor, VendorStats.count, VendorStats.mean, VendorStats.m2).filter(
+            VendorStats.user_id == user_id,
+            VendorStats.vendor.in_(wanted[i : i + 500]),
+            VendorStats.count > 0
+        ).all()
+
+    if not rows:
+        return pd.DataFrame(columns=["mean", "std", "threshold"], dtype=float)
+
+    stats = pd.DataFrame(rows, columns=["vendor", "count", "mean", "m2"]).set_index("vendor")
+    # Sample std like pandas .std(); a single observation falls back to 20% of the mean
+    sample_std = (stats["m2"] / (stats["count"] - 1)).where(stats["count"] > 1)
+    stats["std"] = sample_std.clip(lower=0).pow(0.5).fillna(stats["mean"] * 0.2)
+    stats["threshold"] = stats["mean"] + 2 * stats["std"]
+    return stats[["mean", "std", "threshold"]]
+
+
+def update_vendor_stats(db: Session, user_id: int, summary: Dict[str, Stats]):
+    """Folds a statement's per-vendor summary into the stored statistics. Caller commits."""
+    vendors = list(summary)
+    existing = {}
+    for i in range(0, len(vendors), 500):
+        for row in db.query(VendorStats).filter(
+            VendorStats.user_id == user_id,
+            VendorStats.vendor.in_(vendors[i : i + 500])
+        ).with_for_update():
+            existing[row.vendor] = row
+
+    for vendor, batch in summary.items():
+        row = existing.get(vendor)
+        if row is None:
+            row = VendorStats(user_id=user_id, vendor=vendor, count=0, mean=0.0, m2=0.0)
+            db.add(row)
+        n, mean, m2 = merge_stats((row.count, row.mean, row.m2), batch)
+        if not math.isfinite(mean) or not math.isfinite(m2):
+            continue
+        row.count, row.mean, row.m2 = n, mean, m2
+
+
+def store_analyzed_transactions(db: Session, user_id: int, results, audit_id: int = None) -> int:
+    """
+    Persists analyzed transactions and updates the vendor statistics and daily
+    balances in the same transaction. Flushes but doesn't commit; returns the number of rows stored.
+    """
+    if not results:
+        return 0
+
+    def row(txn) -> dict:
+        probe_vendor, amount_cents = duplicate_key(txn.vendor, txn.description, txn.amount)
+        return {
+            "user_id": user_id,
+            "audit_id": audit_id,
+            "date": txn.date.date() if hasattr(txn.date, "date") else txn.date,
+            "description": txn.description,
+            "vendor": txn.vendor,
+            "amount": txn.amount,
+            "category": txn.category,
+            "is_anomaly": txn.is_anomaly,
+            "risk_score": txn.risk_score,
+            "audit_note": txn.audit_reason,
+            "vendor_key": probe_vendor,
+            "amount_cents": amount_cents,
+        }
+
+    rows = [row(txn) for txn in results]
+    db.bulk_insert_mappings(Transaction, rows)
+    record_inserted(db, rows)  # bulk inserts skip the ORM events that maintain daily_balances
+
+    summary = summarize((vendor_key(txn.vendor), float(txn.amount)) for txn in results)
+    try:
+        with db.begin_nested():
+            update_vendor_stats(db, user_id, summary)
+    except IntegrityError:
+        # Another upload of this user created one of the vendors first: read it back and merge
+        update_vendor_stats(db, user_id, summary)
+
+    db.flush()
+    return len(results)
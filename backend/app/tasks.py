@@ -0,0 +1,46 @@
+from celery import group
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.forecast_snapshots import stale_tenants, refresh_snapshots
+
+# The mappers reference each other by name ("app.models.user.User"): register
+# every model before the first query, as main.py does for the API process
+from app.models.user import User  # noqa: F401
+from app.models.billing import Subscription  # noqa: F401
+from app.models.transactions import Transaction  # noqa: F401
+from app.models.audit import AuditLog  # noqa: F401
+from app.models.vendor_stats import VendorStats  # noqa: F401
+from app.models.anomaly_state import AnomalyState  # noqa: F401
+from app.models.forecast_snapshot import ForecastSnapshot  # noqa: F401
+from app.models.daily_balance import DailyBalance  # noqa: F401
+
+# 🟢 NIGHTLY FORECASTS
+# Beat fires refresh_all_forecasts once a night. It finds tenants whose data
+# changed and fans them out as chunks; each chunk is one task, so the chunks
+# spread across however many workers are consuming the queue.
+
+
+@celery_app.task(name="forecasts.refresh_all")
+def refresh_all_forecasts():
+    db = SessionLocal()
+    try:
+        tenants = stale_tenants(db)
+    finally:
+        db.close()
+
+    size = settings.FORECAST_NIGHTLY_CHUNK_SIZE
+    chunks = [tenants[i : i + size] for i in range(0, len(tenants), size)]
+    if chunks:
+        group(refresh_forecast_chunk.s(chunk) for chunk in chunks).apply_async()
+    print(f"📈 Nightly forecasts: {len(tenants)} tenants changed, {len(chunks)} chunks queued")
+    return {"tenants": len(tenants), "chunks": len(chunks)}
+
+
+@celery_app.task(name="forecasts.refresh_chunk")
+def refresh_forecast_chunk(user_ids):
+    db = SessionLocal()
+    try:
+        return refresh_snapshots(db, user_ids)
+    finally:
+        db.close()
@@ -0,0 +1,231 @@
+from datetime import date, datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import case, create_engine, func, insert, update
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.core.migrations import backfill_daily_balances
+from app.models import user, billing, audit, vendor_stats, anomaly_state  # noqa: F401  (mappers resolve by name)
+from app.models.daily_balance import DailyBalance
+from app.models.forecast_snapshot import ForecastSnapshot
+from app.models.transactions import Transaction
+from app.services.daily_balances import load_daily_balances, rebuild_daily_balances
+from app.services.vendor_stats import store_analyzed_transactions
+
+# Every write path into transactions must leave daily_balances equal to a
+# GROUP BY over transactions, in the same DB transaction.
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'rollup.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine, autoflush=False)()
+    for user_id in (1, 2, 3):
+        session.add(user.User(id=user_id, email=f"{user_id}@example.com", hashed_password="x"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def group_by_truth(db):
+    rows = db.query(
+        Transaction.user_id,
+        Transaction.date,
+        func.sum(Transaction.amount),
+        func.sum(case((Transaction.amount > 0, Transaction.amount), else_=0.0)),
+        func.count(Transaction.id),
+    ).filter(Transaction.user_id.isnot(None)).group_by(Transaction.user_id, Transaction.date)
+    return {(u, d): (round(net, 6), round(pos, 6), n) for u, d, net, pos, n in rows}
+
+
+def rollup(db):
+    return {
+        (row.user_id, row.date): (round(row.net_change, 6), round(row.positive_total, 6), row.txn_count)
+        for row in db.query(DailyBalance)
+    }
+
+
+def assert_in_step(db):
+    db.expire_all()
+    assert rollup(db) == group_by_truth(db)
+
+
+def add(db, user_id, day, amount, description="txn"):
+    txn = Transaction(user_id=user_id, date=date(2026, 9, day), amount=amount, description=description)
+    db.add(txn)
+    return txn
+
+
+def test_store_analyzed_transactions(db):
+    results = [
+        SimpleNamespace(
+            date=datetime(2026, 9, 1 + i % 5), description=f"row {i}", vendor="Acme", amount=float(i * 10 - 40),
+            category="Software", is_anomaly=False, risk_score=0.0, audit_reason="",
+        )
+        for i in range(20)
+    ]
+    store_analyzed_transactions(db, 1, results)
+    db.commit()
+    assert_in_step(db)
+    assert len(rollup(db)) == 5
+
+
+def test_orm_insert_amend_move_delete(db):
+    txn = add(db, 1, 5, 42.5)
+    add(db, 2, 1, -10.0)
+    db.commit()
+    assert_in_step(db)
+
+    txn.amount = 99.0
+    db.commit()
+    assert_in_step(db)
+
+    txn.date, txn.user_id = date(2026, 9, 7), 2
+    db.commit()
+    assert_in_step(db)
+
+    db.delete(txn)
+    db.commit()
+    assert_in_step(db)
+
+
+def test_rollback_leaves_rollup_unchanged(db):
+    add(db, 1, 3, 10.0)
+    db.commit()
+    before = rollup(db)
+
+    add(db, 1, 3, 5.0)
+    db.flush()
+    db.rollback()
+    assert rollup(db) == before
+
+
+def test_bulk_update_and_delete_by_where(db):
+    for day in range(1, 10):
+        add(db, 1, day, day * 50.0)
+        add(db, 2, day, -day * 1.0)
+    db.commit()
+
+    db.query(Transaction).filter(Transaction.amount > 200).update(
+        {Transaction.amount: Transaction.amount * 2}, synchronize_session=False
+    )
+    db.commit()
+    assert_in_step(db)
+
+    db.query(Transaction).filter(Transaction.user_id == 1, Transaction.date < date(2026, 9, 4)).delete(
+        synchronize_session=False
+    )
+    db.commit()
+    assert_in_step(db)
+
+
+def test_bulk_update_moving_rows_to_another_user(db):
+    add(db, 1, 1, 10.0)
+    add(db, 1, 2, 20.0)
+    db.commit()
+
+    # user 3 has no rows before the UPDATE: only the SET clause names it
+    db.execute(update(Transaction).where(Transaction.user_id == 1).values(user_id=3))
+    db.commit()
+    assert_in_step(db)
+    assert {user_id for user_id, _ in rollup(db)} == {3}
+
+    db.query(Transaction).filter(Transaction.date == date(2026, 9, 2)).update(
+        {"user_id": 2}, synchronize_session=False
+    )
+    db.commit()
+    assert_in_step(db)
+
+
+def test_bulk_update_with_user_expression(db):
+    add(db, 1, 1, 10.0)
+    add(db, 2, 1, 20.0)
+    db.commit()
+
+    db.execute(update(Transaction).values(user_id=Transaction.user_id + 1))
+    db.commit()
+    assert_in_step(db)
+
+
+def test_bulk_update_by_primary_key(db):
+    first, second = add(db, 1, 1, 10.0), add(db, 2, 2, 20.0)
+    db.commit()
+
+    db.execute(update(Transaction), [
+        {"id": first.id, "amount": 15.0, "user_id": 3},
+        {"id": second.id, "amount": -5.0},
+    ])
+    db.commit()
+    assert_in_step(db)
+
+
+def test_insert_statement_with_rows(db):
+    db.execute(insert(Transaction), [
+        {"user_id": 2, "date": date(2026, 9, 9), "amount": 5.0, "description": "a"},
+        {"user_id": 2, "date": date(2026, 9, 9), "amount": -7.0, "description": "b"},
+    ])
+    db.commit()
+    assert_in_step(db)
+
+
+def test_rebuild_drops_forecast_snapshots(db):
+    add(db, 1, 1, 10.0)
+    add(db, 2, 1, 10.0)
+    db.add(ForecastSnapshot(user_id=1, txn_count=1, max_txn_id=1, result={"status": "insufficient_data"}))
+    db.add(ForecastSnapshot(user_id=2, txn_count=1, max_txn_id=2, result={"status": "insufficient_data"}))
+    db.commit()
+
+    rebuild_daily_balances(db, [1])
+    db.commit()
+    assert [s.user_id for s in db.query(ForecastSnapshot)] == [2]
+    assert_in_step(db)
+
+
+def test_editing_a_transaction_drops_its_forecast_snapshot(db):
+    txn = add(db, 1, 1, 10.0)
+    db.commit()
+    db.add(ForecastSnapshot(user_id=1, txn_count=1, max_txn_id=txn.id, result={"status": "insufficient_data"}))
+    db.add(ForecastSnapshot(user_id=2, txn_count=0, max_txn_id=0, result={"status": "insufficient_data"}))
+    db.commit()
+
+    # Same row count and max id: only the snapshot's removal makes it stale
+    txn.amount = 500.0
+    db.commit()
+    assert [s.user_id for s in db.query(ForecastSnapshot)] == [2]
+
+    txn.description = "renamed"
+    db.commit()
+    assert [s.user_id for s in db.query(ForecastSnapshot)] == [2]
+
+
+def test_startup_backfill_builds_an_empty_rollup(engine, db):
+    for day in (1, 2, 2):
+        add(db, 1, day, 25.0)
+    db.commit()
+    # As on a database that had transactions before daily_balances existed
+    db.query(DailyBalance).delete()
+    db.commit()
+
+    backfill_daily_balances(engine)
+    assert_in_step(db)
+    assert len(rollup(db)) == 2
+
+
+def test_load_daily_balances_opening_balance(db):
+    for day, amount in ((1, 100.0), (2, -30.0), (3, 50.0), (4, -20.0)):
+        add(db, 1, day, amount)
+    db.commit()
+
+    full = load_daily_balances(db, 1)
+    tail = load_daily_balances(db, 1, start=date(2026, 9, 3))
+    assert list(full["balance"]) == [100.0, 70.0, 120.0, 100.0]
+    assert list(tail["balance"]) == [120.0, 100.0]
@@ -0,0 +1,22 @@
+from app.services import learning_buffer as module
+from app.services.learning_buffer import LearnedCategoryBuffer
+
+
+def test_failed_flush_requeues_oldest_first(monkeypatch):
+    buffer = LearnedCategoryBuffer(batch_size=100, interval=60, max_pending=3)
+    monkeypatch.setattr(buffer, "_ensure_started", lambda: None)
+
+    class FailingStore:
+        def add_documents(self, documents):
+            # Answers learned while the write is in flight
+            buffer.add("NEW ONE", "C")
+            buffer.add("NEW TWO", "D")
+            raise RuntimeError("index down")
+
+    monkeypatch.setattr(module, "get_vector_store", lambda: FailingStore())
+    buffer.add("OLD ONE", "A")
+    buffer.add("OLD TWO", "B")
+    assert buffer.flush() == 0
+
+    # Over the cap: the oldest failed entry goes, not the newest
+    assert [doc.page_content for doc in buffer._pending.values()] == ["OLD TWO", "NEW ONE", "NEW TWO"]
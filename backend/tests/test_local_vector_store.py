@@ -0,0 +1,33 @@
+from langchain_core.documents import Document
+
+from app.services.local_vector_store import HashingEmbeddings, LocalVectorStore
+from app.services.vector_store import recall_threshold
+
+AMAZON = "POS PURCHASE WEB AMAZON MARKETPLACE LAGOS NG"
+
+
+def recalled(store, query):
+    (doc, score), = store.similarity_search_with_score(query, k=1)
+    return doc.metadata["category"] if score > recall_threshold(store.embeddings) else None
+
+
+def test_shared_frame_does_not_recall_another_merchant(tmp_path):
+    store = LocalVectorStore(str(tmp_path), HashingEmbeddings(256))
+    store.add_documents([Document(page_content=AMAZON, metadata={"category": "Shopping"})])
+
+    assert recalled(store, "POS PURCHASE WEB NETFLIX MARKETPLACE LAGOS NG") is None
+    # Same merchant, different reference digits: still a recall
+    assert recalled(store, "POS PURCHASE WEB AMAZON MARKETPLACE LAGOS NG 00417") == "Shopping"
+
+
+def test_filter_keeps_tenants_apart(tmp_path):
+    store = LocalVectorStore(str(tmp_path), HashingEmbeddings(256))
+    store.add_documents([
+        Document(page_content="ACME CLOUD HOSTING", metadata={"category": "Software", "tenant": "1"}),
+        Document(page_content="ACME CLOUD HOSTING", metadata={"category": "Rent", "tenant": "2"}),
+    ])
+
+    (doc, _), = store.similarity_search_with_score("ACME CLOUD HOSTING", k=1, filter={"tenant": "2"})
+    assert doc.metadata["category"] == "Rent"
+    assert store.similarity_search_many(["ACME CLOUD HOSTING"], k=2, filter={"tenant": "3"}) == [[]]
+    assert len(store.similarity_search_many(["ACME CLOUD HOSTING"], k=5)[0]) == 2
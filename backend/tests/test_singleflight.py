@@ -0,0 +1,32 @@
+import asyncio
+
+from app.services.singleflight import SingleFlight
+
+
+def test_overlapping_batches_share_keys():
+    flight = SingleFlight("test.singleflight")
+    asked = []
+
+    async def work(keys):
+        asked.extend(keys)
+        await asyncio.sleep(0.01)
+        return {key: key.upper() for key in keys}
+
+    async def single():
+        return (await work(["a"]))["a"]
+
+    async def main():
+        return await asyncio.gather(
+            flight.do_many(["a", "b", "c"], work),
+            flight.do_many(["b", "c", "d"], work),
+            flight.do("a", single),
+        )
+
+    first, second, third = asyncio.run(main())
+    assert first == {"a": "A", "b": "B", "c": "C"}
+    assert second == {"b": "B", "c": "C", "d": "D"}
+    assert third == "A"
+    # Each key went to the work function once
+    assert sorted(asked) == ["a", "b", "c", "d"]
+    assert (flight.leaders, flight.coalesced) == (4, 3)
+    assert flight.stats()["in_flight"] == 0
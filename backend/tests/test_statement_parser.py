@@ -0,0 +1,37 @@
+from app.agents.statement_parser import GENERIC_TEMPLATE, parse_with_template
+
+# The generic layout is what regex_fallback runs when the LLM fails, so a line
+# it rejects is a transaction lost.
+
+
+def parse(text):
+    transactions, _ = parse_with_template(text, GENERIC_TEMPLATE)
+    return transactions
+
+
+def test_trailing_reference_number():
+    [row] = parse("02/04/2026 TRANSFER TO JOHN DOE 1,250.00 Ref 12345")
+    assert row["date"] == "2026-04-02"
+    assert row["amount"] == 1250.0
+    assert row["description"] == "TRANSFER TO JOHN DOE Ref 12345"
+
+
+def test_trailing_text_with_digits():
+    [row] = parse("15/03/2026 SALARY MARCH 52,000.00 CR 3")
+    assert row["amount"] == 52000.0
+    assert row["description"] == "SALARY MARCH CR 3"
+
+
+def test_last_money_token_is_the_amount():
+    [row] = parse("01/02/2026 POS PURCHASE SHOPRITE 400.00 51,600.00")
+    assert row["amount"] == 51600.0
+    assert row["description"] == "POS PURCHASE SHOPRITE 400.00"
+
+
+def test_amount_digits_are_not_split():
+    [row] = parse("01/02/2026 AWS 12,345.67 ACCT 0123456789")
+    assert row["amount"] == 12345.67
+
+
+def test_lines_without_an_amount_are_skipped():
+    assert parse("01/02/2026 Statement generated for account 0123456789") == []